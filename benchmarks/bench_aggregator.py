@@ -0,0 +1,124 @@
+## Direct mode (every display calls the upstream APIs) versus client mode
+## (one request per cycle to the aggregator), on the "wifi" network profile
+## with a TLS handshake cost per new socket.
+##   python benchmarks/bench_aggregator.py [cycles] [displays]
+## Per display cycle it reports requests, handshakes, bytes and (virtual)
+## time on the device. Upstream requests are per round of every display
+## refreshing once. The first client cycle gets the payload, the rest are
+## 304s as long as nothing upstream changes.
+## It ends with an outage check: every upstream request fails, like fetch()
+## during a DNS outage, and the aggregator must back off without leaking
+## sockets and serve the display again once the upstream is back.
+import sys
+import os
+import io
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from glance_headless import HeadlessHardware, route_request
+from glance_fixtures import NetworkProfile
+from glance_aggregator import Aggregator
+from pyglanceportal import PyGlancePortal
+import payloads
+
+HANDSHAKE = 0.3 # Seconds per TLS handshake on the ESP32
+
+class Counted:
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = 0
+
+    def __call__(self, method, url, headers):
+        self.requests += 1
+        return route_request(self.routes, method, url, headers)
+
+class Outage:
+    ## Upstream that raises while down, the way fetch() does when it can't
+    ## resolve or connect
+    def __init__(self, routes):
+        self.routes = routes
+        self.down = True
+        self.requests = 0
+
+    def __call__(self, method, url, headers):
+        self.requests += 1
+        if self.down:
+            raise ConnectionError("Failed to request " + url.split("/")[2])
+        return route_request(self.routes, method, url, headers)
+
+def outage(cfg, seconds=600, step=5):
+    # Seconds until the display is served again after the outage ends, or
+    # None. The display's back-offs run on virtual time.
+    upstream = Outage(payloads.routes(cfg))
+    aggregator = Aggregator({"d": cfg}, {"https://": upstream})
+    hw = aggregator.displays["d"].hardware
+    hw.virtual_time = True
+    down_requests = 0
+    for t in range(0, seconds * 3, step):
+        if t == seconds:
+            upstream.down = False
+            down_requests = upstream.requests
+        aggregator.refresh()
+        if hw.pool is not None and hw.pool.open_sockets > 0 and upstream.down:
+            raise SystemExit("outage: %d sockets held after failed requests" % hw.pool.open_sockets)
+        status, body, headers = aggregator.respond("d")
+        if upstream.down and status != 503:
+            raise SystemExit("outage: answered %d with nothing fetched" % status)
+        # Served again once the forecast is back in the payload
+        if status == 200 and len(body.split(b"\n")[1]) > 0:
+            return t - seconds, down_requests
+        hw.elapsed += step
+    return None, down_requests
+
+def device(routes, cfg):
+    hw = HeadlessHardware(routes=routes, profile=NetworkProfile(latency=0.08, throughput=40000), handshake_latency=HANDSHAKE, virtual_time=True)
+    return hw, PyGlancePortal(debug=False, hardware=hw, config=cfg)
+
+def measure(devices, cycles, before_round=None):
+    totals = [0, 0, 0, 0.0] # requests, handshakes, bytes, seconds
+    for x in range(cycles):
+        if before_round is not None:
+            before_round()
+        for hw, portal in devices:
+            start = (hw.request_count, hw.pool.opened if hw.pool else 0, hw.http.bytes_received if hw.http else 0, hw.monotonic())
+            portal.build_display(force=True)
+            end = (hw.request_count, hw.pool.opened, hw.http.bytes_received, hw.monotonic())
+            for idx in range(4):
+                totals[idx] += end[idx] - start[idx]
+    n = cycles * len(devices)
+    return [x / n for x in totals]
+
+def main(cycles=5, displays=4):
+    cfg = payloads.config(3, 3, 4)
+    print("%-8s %10s %10s %10s %10s %14s" % ("mode", "req/cyc", "tls/cyc", "B/cyc", "s/cyc", "upstream/round"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        upstream = Counted(payloads.routes(cfg))
+        direct = [device({"https://": upstream}, cfg) for x in range(displays)]
+        result = measure(direct, cycles)
+        direct_upstream = upstream.requests / cycles
+
+        upstream = Counted(payloads.routes(cfg))
+        aggregator = Aggregator(dict(("d" + str(x), cfg) for x in range(displays)), {"https://": upstream})
+        clients = []
+        for x in range(displays):
+            client = dict(cfg, aggregator_url="http://aggregator/d" + str(x))
+            clients.append(device({"http://aggregator/": aggregator}, client))
+        # Each round the aggregator refreshes every display from an empty
+        # cache, so only requests shared within the round are collapsed
+        def round():
+            aggregator.cache.clear()
+            aggregator.refresh(force=True)
+        client_result = measure(clients, cycles, round)
+        client_upstream = upstream.requests / cycles
+    for name, r, u in (("direct", result, direct_upstream), ("client", client_result, client_upstream)):
+        print("%-8s %10.1f %10.1f %10.0f %10.2f %14.1f" % (name, r[0], r[1], r[2], r[3], u))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        recovered, down_requests = outage(cfg)
+    if recovered is None:
+        raise SystemExit("outage: display still not served after the upstream came back")
+    print("outage: %d upstream requests in 600s down, served again %ds after recovery" % (down_requests, recovered))
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:3]])
@@ -0,0 +1,89 @@
+## Steady-state allocation with unchanged upstream data, checked against a
+## budget. Exits non-zero when over budget.
+##   python benchmarks/bench_alloc.py [cycles]
+## Payloads are encoded once up front so the fake session adds as little as
+## possible. A full cycle still reads and extracts every response like the
+## device does; the render pass redraws every section from the stored state
+## with no network at all. It leaves out display.refresh(), which is native
+## code on the device and would only measure the headless rasteriser here.
+import sys
+import os
+import contextlib
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from glance_headless import HeadlessHardware, Response, _json_dumps
+from pyglanceportal import PyGlancePortal
+import payloads
+
+# Bytes per cycle
+BUDGETS = {
+    "cycle retained": 64,
+    "cycle peak": 16384,
+    "render retained": 0,
+    "render peak": 512,
+}
+
+class Discard:
+    # A StringIO or buffered file would show up as retained memory
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+def encoded_routes(cfg):
+    cache = {}
+    def route(payload):
+        def serve(method, url, headers):
+            if url not in cache:
+                p = payload(method, url, headers) if callable(payload) else payload
+                cache[url] = _json_dumps(p)
+            return Response(200, cache[url])
+        return serve
+    return dict((prefix, route(payload)) for prefix, payload in payloads.routes(cfg).items())
+
+def render(portal):
+    portal.render_weather()
+    portal.render_streamers()
+    portal.render_sports()
+
+def measure(step, cycles):
+    tracemalloc.start()
+    peak = 0
+    for x in range(cycles):
+        if x == cycles // 2:
+            # Growth over the second half only, state replaced by the first
+            # traced cycles and interpreter caches settle before that
+            base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        step()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - start)
+    retained = (tracemalloc.get_traced_memory()[0] - base) / (cycles - cycles // 2)
+    tracemalloc.stop()
+    return retained, peak
+
+def main(cycles=40):
+    cfg = payloads.config(3, 3, 4)
+    hw = HeadlessHardware(routes=encoded_routes(cfg))
+    results = {}
+    with contextlib.redirect_stdout(Discard()):
+        portal = PyGlancePortal(debug=False, hardware=hw, config=cfg)
+        # Warm up: the first cycles fill the caches and settle the display
+        for x in range(3):
+            portal.build_display(force=True)
+        results["cycle retained"], results["cycle peak"] = measure(lambda: portal.build_display(force=True), cycles)
+        results["render retained"], results["render peak"] = measure(lambda: render(portal), cycles)
+    over = False
+    print("%-16s %10s %10s" % ("per cycle", "bytes", "budget"))
+    for name, budget in BUDGETS.items():
+        print("%-16s %10.0f %10d" % (name, results[name], budget))
+        over = over or results[name] > budget
+    if over:
+        print("Over budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
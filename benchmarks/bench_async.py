@@ -0,0 +1,64 @@
+## Time per full refresh and longest gap between UI ticks, synchronous
+## build_display() versus the asyncio engine, on the "wifi" network profile.
+##   python benchmarks/bench_async.py [refreshes] [leagues]
+## In sync mode the UI can only run between refreshes, so its gap is the
+## whole refresh.
+import sys
+import os
+import io
+import time
+import asyncio
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from glance_headless import HeadlessHardware
+from glance_fixtures import PROFILES
+from glance_async import AsyncRefresher
+from pyglanceportal import PyGlancePortal
+import payloads
+
+def portal(cfg):
+    profile = PROFILES["wifi"]
+    profile.reset()
+    hw = HeadlessHardware(routes=payloads.routes(cfg), profile=profile)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return PyGlancePortal(debug=False, hardware=hw, config=cfg)
+
+def run_sync(cfg, refreshes):
+    p = portal(cfg)
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for x in range(refreshes):
+            start = time.monotonic()
+            p.build_display(force=True)
+            times.append(time.monotonic() - start)
+    return times, max(times)
+
+async def run_async_refreshes(refresher, refreshes):
+    ui = asyncio.create_task(refresher.ui_loop())
+    times = []
+    for x in range(refreshes):
+        start = time.monotonic()
+        await refresher.refresh(force=True)
+        times.append(time.monotonic() - start)
+    ui.cancel()
+    return times
+
+def run_async(cfg, refreshes):
+    refresher = AsyncRefresher(portal(cfg))
+    with contextlib.redirect_stdout(io.StringIO()):
+        times = asyncio.run(run_async_refreshes(refresher, refreshes))
+    return times, refresher.max_ui_gap
+
+def main(refreshes=3, leagues=3):
+    cfg = payloads.config(leagues, 3, 4)
+    print("%-6s %12s %12s %12s" % ("mode", "avg s", "max s", "UI gap s"))
+    for name, run in (("sync", run_sync), ("async", run_async)):
+        times, gap = run(cfg, refreshes)
+        print("%-6s %12.2f %12.2f %12.2f" % (name, sum(times) / len(times), max(times), gap))
+
+if __name__ == "__main__":
+    refreshes = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    leagues = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    main(refreshes, leagues)
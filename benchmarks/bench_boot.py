@@ -0,0 +1,83 @@
+## Time to first pixel and to first live display, cold boot versus a reboot
+## with a stored warm-start snapshot. Then, for a full, a minimal (one
+## league) and an aggregator client config: the glance modules loaded, time
+## to import and set up, and memory held after one refresh. Each config runs
+## in a fresh interpreter so imports are counted from scratch.
+##   python benchmarks/bench_boot.py [latency_seconds] [connect_seconds]
+import sys
+import os
+import io
+import json
+import time
+import contextlib
+import subprocess
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from glance_headless import HeadlessHardware, Response
+import payloads
+
+# Stands in for the aggregator so the client run doesn't import the
+# upstream source modules on the aggregator's behalf
+AGGREGATE = Response(200, b"1\nclear-day,49,67;cloudy,51,69\nstreamer0\nnhl/nhlt0", {"etag": '"1"', "x-glance-time": "2024,5,15,12,5,0,3,136,1"})
+
+def boot(cfg, routes, latency, connect, nvm=None):
+    from pyglanceportal import PyGlancePortal
+    hw = HeadlessHardware(routes=routes, latency=latency, nvm=nvm)
+    hw.esp.latency = connect
+    with contextlib.redirect_stdout(io.StringIO()):
+        portal = PyGlancePortal(debug=False, hardware=hw, config=cfg)
+        portal.build_display()
+    return hw, portal
+
+def configs():
+    full = payloads.config()
+    minimal = dict((k, full[k]) for k in ("ssid", "password", "timezone", "aio_username", "aio_key", "sports_leagues", "sports_api_nhl", "sports_api_nhl_teams"))
+    minimal["sports_leagues"] = "nhl"
+    client = dict(full, aggregator_url="http://aggregator/display")
+    return {"full": full, "minimal": minimal, "client": client}
+
+def resident(name):
+    # Child process: the hardware (and its framebuffer) exists before the
+    # baseline, everything the portal imports and allocates is counted
+    tracemalloc.start()
+    routes = payloads.routes(payloads.config())
+    if name == "client":
+        routes = {"http://aggregator/": AGGREGATE}
+    hw = HeadlessHardware(routes=routes)
+    modules = set(sys.modules)
+    with contextlib.redirect_stdout(io.StringIO()):
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.monotonic()
+        import pyglanceportal
+        imported = tracemalloc.get_traced_memory()[0] - base
+        portal = pyglanceportal.PyGlancePortal(debug=False, hardware=hw, config=configs()[name])
+        setup = time.monotonic() - start
+        portal.build_display()
+    loaded = sorted(x for x in set(sys.modules) - modules if x.startswith("glance") or x == "pyglanceportal")
+    print(json.dumps({"modules": loaded, "setup": setup, "imported": imported, "resident": tracemalloc.get_traced_memory()[0] - base}))
+
+def main(latency=0.1, connect=2.0):
+    cfg = payloads.config()
+    routes = payloads.routes(cfg)
+    print("%-6s %14s %14s" % ("boot", "first pixel s", "first live s"))
+    hw, portal = boot(cfg, routes, latency, connect)
+    print("%-6s %14.2f %14.2f" % ("cold", portal.first_pixel_time, portal.first_live_time))
+    hw, portal = boot(cfg, routes, latency, connect, hw.nvm)
+    print("%-6s %14.2f %14.2f" % ("warm", portal.first_pixel_time, portal.first_live_time))
+    print()
+    print("%-8s %8s %8s %12s %12s  %s" % ("config", "modules", "setup s", "import KB", "resident KB", "source modules"))
+    for name in configs():
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--resident", name], capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        sources = [x for x in r["modules"] if x in ("glance_weather", "glance_twitch", "glance_sports")]
+        print("%-8s %8d %8.3f %12.1f %12.1f  %s" % (name, len(r["modules"]), r["setup"], r["imported"] / 1024, r["resident"] / 1024, ",".join(sources) or "-"))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--resident":
+        resident(sys.argv[2])
+        sys.exit(0)
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.1
+    connect = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+    main(latency, connect)
@@ -0,0 +1,53 @@
+## Cycle time and memory for the build_* steps on the headless backend.
+##   python benchmarks/bench_cycle.py [cycles] [latency_seconds]
+import sys
+import os
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from glance_headless import HeadlessHardware
+from pyglanceportal import PyGlancePortal
+import payloads
+
+STEPS = ["build_datetime", "build_weather", "build_streamers", "build_sports", "build_display"]
+
+def measure(portal, step):
+    portal._debug_alloc_counter = 0
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    if step == "build_display":
+        portal.build_display(force=True)
+    else:
+        getattr(portal, step)()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    return elapsed, peak - before, current - before, portal._debug_alloc_counter
+
+def main(cycles=5, latency=0.0):
+    cfg = payloads.config()
+    hw = HeadlessHardware(routes=payloads.routes(cfg), latency=latency)
+    portal = PyGlancePortal(debug=False, hardware=hw, config=cfg)
+    tracemalloc.start()
+    print("%-16s %10s %10s %10s %10s %10s" % ("step", "ms/cycle", "peak B", "retained B", "requests", "objects"))
+    for step in STEPS:
+        total = 0.0
+        peak = 0
+        retained = 0
+        objects = 0
+        requests_before = hw.request_count
+        for x in range(cycles):
+            elapsed, p, r, o = measure(portal, step)
+            total += elapsed
+            objects += o
+            peak = max(peak, p)
+            retained = max(retained, r)
+        print("%-16s %10.2f %10d %10d %10.1f %10.1f" % (step, total * 1000 / cycles, peak, retained, (hw.request_count - requests_before) / cycles, objects / cycles))
+    tracemalloc.stop()
+
+if __name__ == "__main__":
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    main(cycles, latency)
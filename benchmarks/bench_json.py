@@ -0,0 +1,58 @@
+## Peak allocation of r.json() versus glance_json streaming extraction.
+##   python benchmarks/bench_json.py [forecast.json] [team.json]
+## Recorded payloads can be passed in; synthetic ones of growing size are
+## used otherwise. Peaks exclude the raw body itself, which r.json() also
+## has to hold in full on the device while the extractor only holds a chunk.
+import sys
+import os
+import json
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import glance_json
+from glance_weather import PATHS as FORECAST_PATHS
+from glance_sports import TEAM_PATHS
+import payloads
+
+CHUNK_SIZE = 256
+
+def chunks(raw):
+    for i in range(0, len(raw), CHUNK_SIZE):
+        yield raw[i:i+CHUNK_SIZE]
+
+def peak(fn):
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    return tracemalloc.get_traced_memory()[1] - before, elapsed
+
+def compare(name, raw, trie):
+    full, full_t = peak(lambda: json.loads(raw))
+    stream, stream_t = peak(lambda: glance_json.extract(chunks(raw), trie))
+    print("%-24s %9d %11d %11d %9.1f %9.1f" % (name, len(raw), full, stream, full_t * 1000, stream_t * 1000))
+
+def main(paths):
+    cases = []
+    if paths:
+        for path in paths:
+            with open(path, "rb") as f:
+                raw = f.read()
+            trie = TEAM_PATHS if b'"sports"' in raw[:200] else FORECAST_PATHS
+            cases.append((os.path.basename(path), raw, trie))
+    else:
+        for hours in (0, 48, 168):
+            cases.append(("forecast hours=" + str(hours), json.dumps(payloads.forecast(hours=hours, minutes=61 if hours else 0)).encode(), FORECAST_PATHS))
+        for events in (1, 5, 25):
+            cases.append(("espn events=" + str(events), json.dumps(payloads.espn_team("nhl", "pit", "in", events=events)).encode(), TEAM_PATHS))
+    tracemalloc.start()
+    print("%-24s %9s %11s %11s %9s %9s" % ("payload", "bytes", "json peak B", "extract B", "json ms", "extr ms"))
+    for name, raw, trie in cases:
+        compare(name, raw, trie)
+    tracemalloc.stop()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,39 @@
+## Requests and wall time per sports refresh, per-team versus scoreboard mode.
+##   python benchmarks/bench_sports.py [cycles] [latency_seconds]
+import sys
+import os
+import io
+import time
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from glance_headless import HeadlessHardware
+from pyglanceportal import PyGlancePortal
+import payloads
+
+def run(batch, leagues, teams, cycles, latency):
+    cfg = payloads.config(leagues=leagues, teams=teams)
+    cfg["sports_batch"] = batch
+    hw = HeadlessHardware(routes=payloads.routes(cfg), latency=latency)
+    with contextlib.redirect_stdout(io.StringIO()):
+        portal = PyGlancePortal(debug=False, hardware=hw, config=cfg)
+        before = hw.request_count
+        start = time.perf_counter()
+        for x in range(cycles):
+            portal.build_sports()
+        elapsed = time.perf_counter() - start
+    live = sum(portal._sports[x].live_count() for x in portal._leagues)
+    return (hw.request_count - before) / cycles, elapsed * 1000 / cycles, live
+
+def main(cycles=3, latency=0.05):
+    print("%-10s %8s %6s %10s %10s %6s" % ("mode", "leagues", "teams", "req/cycle", "ms/cycle", "live"))
+    for leagues, teams in ((1, 3), (3, 3), (8, 3), (8, 6)):
+        for batch in (False, True):
+            requests, ms, live = run(batch, leagues, teams, cycles, latency)
+            print("%-10s %8d %6d %10.1f %10.1f %6d" % ("scoreboard" if batch else "per-team", leagues, teams, requests, ms, live))
+
+if __name__ == "__main__":
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    main(cycles, latency)
@@ -0,0 +1,81 @@
+## Full build_display cycles across league/team/streamer counts and network
+## profiles, on virtual time so slow profiles and back-offs run at full speed.
+##   python benchmarks/bench_suite.py [cycles] [fixtures_dir]
+## With a fixtures directory (tools/record_fixtures.py) the recorded
+## responses and config are replayed instead of the synthetic payloads.
+## Cycle times include the simulated network time and the 1s LED sleep.
+## Cycles cut short by a network error are counted as aborted and left out
+## of the throughput and percentiles.
+import sys
+import os
+import io
+import contextlib
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from glance_headless import HeadlessHardware
+from glance_fixtures import PROFILES, Replayer
+from pyglanceportal import PyGlancePortal
+import payloads
+
+SIZES = [(1, 1, 2), (3, 3, 4), (8, 3, 8)] # leagues, teams per league, streamers
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+def run(cfg, routes, profile, cycles):
+    profile.reset()
+    hw = HeadlessHardware(routes=routes, profile=profile, virtual_time=True)
+    times = []
+    aborted = 0
+    peak = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        portal = PyGlancePortal(debug=False, hardware=hw, config=cfg)
+        tracemalloc.start()
+        for x in range(cycles):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            start = hw.monotonic()
+            if portal.build_display(force=True):
+                times.append(hw.monotonic() - start)
+            else:
+                aborted += 1
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+            # Like code.py, wait out a pending reconnect before the next cycle
+            hw.sleep(portal.next_refresh() if portal._reconnect_at is not None else 0)
+        tracemalloc.stop()
+    if len(times) == 0:
+        times = [0]
+    return {
+        "throughput": len(times) / sum(times) * 60 if sum(times) > 0 else 0,
+        "p50": percentile(times, 0.5),
+        "p95": percentile(times, 0.95),
+        "p99": percentile(times, 0.99),
+        "max": max(times),
+        "peak": peak,
+        "requests": hw.request_count / cycles,
+        "aborted": aborted,
+        "errors": portal._debug_total_error_counter + portal._debug_total_reset_counter,
+        "faults": sum(profile.faults.values()),
+    }
+
+def main(cycles=10, fixtures=None):
+    if fixtures is None:
+        cases = []
+        for leagues, teams, streamers in SIZES:
+            cfg = payloads.config(leagues, teams, streamers)
+            cases.append(("%d/%d/%d" % (leagues, teams, streamers), cfg, payloads.routes(cfg)))
+    else:
+        replayer = Replayer(fixtures)
+        cases = [(os.path.basename(fixtures.rstrip("/")), replayer.config, {"https://": replayer, "http://": replayer})]
+    print("%-10s %-6s %9s %8s %8s %8s %8s %9s %8s %7s %7s %7s" % ("l/t/s", "net", "cycles/m", "p50 s", "p95 s", "p99 s", "max s", "peak B", "req/cyc", "aborted", "errors", "faults"))
+    for name, cfg, routes in cases:
+        for profile_name, profile in PROFILES.items():
+            r = run(cfg, routes, profile, cycles)
+            print("%-10s %-6s %9.1f %8.2f %8.2f %8.2f %8.2f %9d %8.1f %7d %7d %7d" % (name, profile_name, r["throughput"], r["p50"], r["p95"], r["p99"], r["max"], r["peak"], r["requests"], r["aborted"], r["errors"], r["faults"]))
+
+if __name__ == "__main__":
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    main(cycles, sys.argv[2] if len(sys.argv) > 2 else None)
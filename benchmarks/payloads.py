@@ -0,0 +1,109 @@
+## Synthetic upstream payloads shaped like the real Pirate Weather, ESPN,
+## Twitch and Adafruit IO responses, sized so the parts pyglanceportal.py
+## ignores (hourly blocks, full event trees) cost what they do in the wild.
+
+ICONS = ["clear-day", "partly-cloudy-day", "cloudy", "rain", "snow", "wind", "fog", "sleet"]
+
+def datetime_struct(hour=12, minute=5, wday=3):
+    return {"year": 2024, "mon": 5, "mday": 15, "hour": hour, "min": minute, "sec": 0,
+            "wday": wday, "yday": 136, "isdst": 1}
+
+def forecast(days=8, hours=48, minutes=61):
+    point = {"time": 1715760000, "summary": "Mostly cloudy", "precipIntensity": 0.0, "precipProbability": 0.1,
+             "temperature": 61.2, "apparentTemperature": 60.8, "dewPoint": 50.1, "humidity": 0.67,
+             "pressure": 1014.2, "windSpeed": 7.4, "windGust": 12.9, "windBearing": 250,
+             "cloudCover": 0.73, "uvIndex": 3, "visibility": 10, "ozone": 320.4}
+    daily = []
+    for x in range(days):
+        day = dict(point)
+        day.update({"icon": ICONS[x % len(ICONS)], "temperatureLow": 48.6 + x, "temperatureHigh": 67.4 + x})
+        daily.append(day)
+    return {
+        "latitude": 37.8267, "longitude": -122.4233, "timezone": "America/Los_Angeles",
+        "currently": dict(point, icon="cloudy"),
+        "minutely": {"summary": "Cloudy", "icon": "cloudy", "data": [{"time": 1715760000 + m * 60, "precipIntensity": 0.0, "precipProbability": 0.0} for m in range(minutes)]},
+        "hourly": {"summary": "Cloudy", "icon": "cloudy", "data": [dict(point, icon="cloudy") for h in range(hours)]},
+        "daily": {"summary": "Mixed", "icon": "rain", "data": daily},
+        "alerts": [],
+        "flags": {"sources": ["ETOPO1", "gfs", "gefs", "hrrrsubh", "hrrr_0-18", "nbm"], "units": "us", "version": "V2.0.6"},
+    }
+
+def _event(league, team, opponent, status):
+    competitor = lambda abbr, home: {"id": abbr, "abbreviation": abbr.upper(), "displayName": abbr.upper() + " Club", "homeAway": "home" if home else "away",
+                                     "score": "2", "logo": "https://a.espncdn.com/i/teamlogos/" + league + "/500/" + abbr + ".png",
+                                     "color": "000000", "alternateColor": "ffffff", "record": "10-5-2", "winner": False}
+    return {
+        "id": team + opponent, "date": "2024-05-15T23:00Z", "name": team.upper() + " at " + opponent.upper(),
+        "shortName": team.upper() + " @ " + opponent.upper(), "status": status, "summary": "2nd - 10:31",
+        "period": 2, "clock": "10:31", "location": "Arena", "broadcasts": [{"name": "ESPN+"}, {"name": "Local"}],
+        "competitors": [competitor(team, False), competitor(opponent, True)],
+        "links": [{"href": "https://www.espn.com/" + league + "/game/_/gameId/" + str(i), "rel": ["summary"]} for i in range(6)],
+        "odds": {"details": "-120", "overUnder": 5.5},
+    }
+
+def espn_team(league, team, status="pre", events=3):
+    evs = [_event(league, team, "opp" + str(i), status if i == 0 else "pre") for i in range(events)]
+    return {"sports": [{"name": league, "leagues": [{"abbreviation": league, "events": evs}]}]}
+
+def espn_scoreboard(league, live, idle, other_games=6):
+    evs = [_event(league, team, "opp" + str(i), "in") for i, team in enumerate(live)]
+    evs += [_event(league, team, "opp" + str(i), "pre") for i, team in enumerate(idle)]
+    evs += [_event(league, "other" + str(i), "rival" + str(i), "in" if i % 2 else "post") for i in range(other_games)]
+    return {"sports": [{"name": league, "leagues": [{"abbreviation": league, "events": evs}]}]}
+
+def twitch_streams(live, offline=()):
+    data = []
+    for name in live:
+        data.append({"id": "1", "user_id": "2", "user_login": name, "user_name": name, "game_id": "509658",
+                     "game_name": "Just Chatting", "type": "live", "title": "Stream title for " + name,
+                     "viewer_count": 1234, "started_at": "2024-05-15T20:00:00Z", "language": "en",
+                     "thumbnail_url": "https://static-cdn.jtvnw.net/previews-ttv/live_user_" + name + "-{width}x{height}.jpg",
+                     "tag_ids": [], "tags": ["English"], "is_mature": False})
+    return {"data": data, "pagination": {}}
+
+def twitch_token():
+    return {"access_token": "headlesstoken", "expires_in": 5184000, "token_type": "bearer"}
+
+def twitch_validate():
+    return {"client_id": "headless", "scopes": [], "expires_in": 5184000}
+
+LEAGUES = ["nhl", "nfl", "mlb", "prem", "mls", "nwsl", "usmnt", "uswnt"]
+ESPN_URL = "https://site.web.api.espn.com/apis/v2/scoreboard/header?sport=x&league={league}&team="
+ESPN_ROUTE = "https://site.web.api.espn.com/apis/v2/scoreboard/header?sport=x&league={league}"
+
+def config(leagues=3, teams=3, streamers=4):
+    cfg = {
+        "ssid": "headless", "password": "", "timezone": "America/Chicago",
+        "aio_username": "user", "aio_key": "key",
+        "pirateweather_api_key": "key",
+        "pirateweather_api_forecast": "https://api.pirateweather.net/forecast/{pirateweather_api_key}/37.8267,-122.4233?exclude=minutely,hourly,alerts",
+        "twitch_api_key": "id", "twitch_api_secret": "secret",
+        "twitch_api_streamers": ",".join("streamer" + str(i) for i in range(streamers)),
+        "sports_leagues": ",".join(LEAGUES[:leagues]),
+    }
+    for idx, league in enumerate(LEAGUES):
+        cfg["sports_api_" + league] = ESPN_URL.format(league=league)
+        cfg["sports_api_" + league + "_teams"] = ",".join(league + "t" + str(i) for i in range(teams)) if idx < leagues else ""
+    return cfg
+
+def routes(cfg, live_every=2, forecast_kwargs=None):
+    def is_live(abbr):
+        return int(abbr.split("t")[-1]) % live_every == 0
+    def team(method, url, headers):
+        league = url.split("league=")[1].split("&")[0]
+        abbr = url.split("team=")[1] if "team=" in url else ""
+        if len(abbr) == 0:
+            teams = [x for x in cfg.get("sports_api_" + league + "_teams", "").split(",") if len(x) > 0]
+            return espn_scoreboard(league, [x for x in teams if is_live(x)], [x for x in teams if not is_live(x)])
+        return espn_team(league, abbr, "in" if is_live(abbr) else "pre")
+    streamers = cfg["twitch_api_streamers"].split(",")
+    r = {
+        "https://io.adafruit.com/": datetime_struct(),
+        "https://api.pirateweather.net/": forecast(**(forecast_kwargs or {})),
+        "https://id.twitch.tv/oauth2/token": twitch_token(),
+        "https://id.twitch.tv/oauth2/validate": twitch_validate(),
+        "https://api.twitch.tv/helix/streams": twitch_streams(streamers[::2]),
+    }
+    for league in LEAGUES:
+        r[ESPN_ROUTE.format(league=league)] = team
+    return r
@@ -1,8 +1,19 @@
 import time
+import gc
+boot_start = time.monotonic()
 from pyglanceportal import PyGlancePortal
+gc.collect()
+print("Imported in %.2fs, %d bytes free" % (time.monotonic() - boot_start, gc.mem_free()))
+
+USE_ASYNC = False # Needs the adafruit_asyncio and adafruit_touchscreen libraries
 
 pyportal = PyGlancePortal(debug=True)
 
+if USE_ASYNC:
+    import asyncio
+    from glance_async import AsyncRefresher
+    asyncio.run(AsyncRefresher(pyportal).run())
+
 while True:
     pyportal.build_display()
-    time.sleep(300)
\ No newline at end of file
+    time.sleep(pyportal.next_refresh())
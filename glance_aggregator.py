@@ -0,0 +1,127 @@
+import time
+import zlib
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from glance_headless import HeadlessHardware, Response, route_request
+from glance_fixtures import fetch
+from pyglanceportal import PyGlancePortal
+
+## Companion aggregator (CPython only). It runs one headless PyGlancePortal
+## per display against the real APIs, so fetching, parsing, scheduling and
+## back-off are the same code the device runs. Each display then gets a
+## single small payload instead of talking to four providers itself:
+##
+##     python tools/aggregator.py --port 8080
+##     secrets["aggregator_url"] = "http://192.168.1.10:8080/kitchen"
+##
+## The payload is the state part of the warm-start snapshot: forecast
+## triples, live streamers and live team keys, one line each. It carries an
+## ETag, so an unchanged payload is a 304 with no body. Local time goes in
+## the X-Glance-Time header, which is sent with 304s too. Until every source
+## of a display has been fetched once the answer is a 503 with no ETag, so a
+## display never takes an empty payload for real data. A source whose
+## circuit has opened no longer holds the others back; its section stays
+## empty until it recovers.
+##
+## Upstream requests go through one SharedCache, so displays that ask for
+## the same forecast or scoreboard within `ttl` seconds share one request.
+##
+## Headless clients can use an Aggregator as a route directly, with no
+## server in between:
+##     HeadlessHardware(routes={"http://aggregator/": aggregator})
+
+TIME_HEADER = "x-glance-time"
+
+class SharedCache:
+    ## Route callable in front of the upstream routes. Successful responses
+    ## are kept for ttl seconds per method and URL.
+    def __init__(self, routes, ttl=30, clock=time.monotonic):
+        self.routes = routes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = {} # (method, url) -> (expires, Response)
+        self.requests = 0
+        self.hits = 0
+
+    def __call__(self, method, url, headers):
+        key = (method, url)
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is not None and now < entry[0]:
+            self.hits += 1
+            return entry[1]
+        self.requests += 1
+        response = route_request(self.routes, method, url, headers)
+        if response.status_code == 200:
+            self._entries[key] = (now + self.ttl, response)
+        return response
+
+    def clear(self):
+        self._entries = {}
+
+class Aggregator:
+    ## configs maps a display name to its config (a secrets dict). routes
+    ## stand in for the upstream APIs, live HTTPS by default.
+    def __init__(self, configs, routes=None, ttl=30):
+        if routes is None:
+            routes = {"https://": fetch, "http://": fetch}
+        self.cache = SharedCache(routes, ttl)
+        self.displays = {}
+        for name, cfg in configs.items():
+            hw = HeadlessHardware(routes={"https://": self.cache, "http://": self.cache})
+            self.displays[name] = PyGlancePortal(debug=False, hardware=hw, config=cfg)
+
+    def refresh(self, force=False):
+        # One display failing must not stop the others or the server
+        for name, portal in self.displays.items():
+            try:
+                if force or portal.next_refresh() <= 0:
+                    portal.build_display(force)
+            except Exception as e:
+                print("Failed to refresh display " + name + "\n", e)
+
+    def next_refresh(self):
+        return min([x.next_refresh() for x in self.displays.values()] or [60])
+
+    def respond(self, name, etag=None):
+        # (status, body, headers) for one display
+        portal = self.displays.get(name)
+        if portal is None:
+            return 404, b"", {}
+        headers = {}
+        clock = portal.encode_time()
+        if clock is not None:
+            headers[TIME_HEADER] = clock
+        if not portal.ready:
+            return 503, b"", headers
+        body = portal.encode_aggregate()
+        headers["etag"] = '"%08x"' % zlib.crc32(body)
+        if etag == headers["etag"]:
+            return 304, b"", headers
+        return 200, body, headers
+
+    def __call__(self, method, url, headers):
+        self.refresh()
+        status, body, headers = self.respond(url.split("?")[0].rstrip("/").split("/")[-1], headers.get("If-None-Match"))
+        return Response(status, body, headers)
+
+def serve(aggregator, host="", port=8080):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, body, headers = aggregator.respond(self.path.split("?")[0].strip("/"), self.headers.get("If-None-Match"))
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("content-type", "text/plain; charset=utf-8")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    # Single threaded: upstream polling happens between requests, so the
+    # portals are never used from two places at once
+    server = HTTPServer((host, port), Handler)
+    print("Serving %s on port %d" % (", ".join(aggregator.displays), port))
+    while True:
+        aggregator.refresh()
+        server.timeout = max(0.1, min(aggregator.next_refresh(), 5))
+        server.handle_request()
@@ -0,0 +1,103 @@
+import asyncio
+
+## asyncio refresh engine. Every due source is its own task and its section
+## is drawn as soon as it completes, while a UI task keeps polling the
+## touchscreen and driving the status light between fetches.
+##
+## adafruit_requests over ESP32SPI blocks for the whole request and closes
+## the previous response when a new one starts, so only one request is in
+## flight at a time; the fetch lock makes that explicit. What the engine buys
+## is that the loop gets control back after every request instead of after
+## the whole refresh. A touch forces a refresh of everything.
+##     asyncio.run(AsyncRefresher(pyportal).run())
+
+UI_INTERVAL = 0.05
+TOUCH_COOLDOWN = 30 # Seconds between touch-triggered refreshes
+
+STATUS_IDLE = (0, 0, 0)
+STATUS_FETCHING = (0, 0, 64)
+STATUS_STALE = (64, 16, 0)
+
+class AsyncRefresher:
+    def __init__(self, portal):
+        self._portal = portal
+        self._hw = portal.hardware
+        self._fetch_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._force = False
+        self._last_touch = None
+        self.refreshing = False
+        self.ui_ticks = 0
+        self.touches = 0
+        self.max_ui_gap = 0.0
+
+    async def fetch(self, name):
+        async with self._fetch_lock:
+            self._portal.refresh_source(name)
+            # Draw this section now instead of waiting for the other sources
+            self._portal.show_display()
+            # Yield while still holding the lock, otherwise the next source
+            # starts its fetch in the same pass of the event loop
+            await asyncio.sleep(0)
+
+    async def refresh(self, force=False):
+        portal = self._portal
+        self.refreshing = True
+        try:
+            if not portal.ensure_connected():
+                return
+            due = portal.begin_refresh(force)
+            portal.refresh_datetime(due)
+            await asyncio.sleep(0)
+            tasks = [asyncio.create_task(self.fetch(x)) for x in due if x != "datetime"]
+            try:
+                for task in tasks:
+                    await task
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+            portal.finish_refresh()
+        except (RuntimeError, TimeoutError, BrokenPipeError, ConnectionError) as e:
+            portal.refresh_failed(e)
+        finally:
+            self.refreshing = False
+
+    def service_ui(self):
+        if self._hw.touch_point() is not None:
+            self.touches += 1
+            now = self._hw.monotonic()
+            if not self.refreshing and (self._last_touch is None or now - self._last_touch >= TOUCH_COOLDOWN):
+                self._last_touch = now
+                self._force = True
+                self._wake.set()
+        if self.refreshing:
+            self._hw.status_light.fill(STATUS_FETCHING)
+        elif self._portal.stale:
+            self._hw.status_light.fill(STATUS_STALE)
+        else:
+            self._hw.status_light.fill(STATUS_IDLE)
+
+    async def ui_loop(self):
+        last = self._hw.monotonic()
+        while True:
+            self.service_ui()
+            self.ui_ticks += 1
+            await asyncio.sleep(UI_INTERVAL)
+            now = self._hw.monotonic()
+            self.max_ui_gap = max(self.max_ui_gap, now - last)
+            last = now
+
+    async def refresh_loop(self):
+        while True:
+            force = self._force
+            self._force = False
+            await self.refresh(force)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._portal.next_refresh())
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        await asyncio.gather(self.refresh_loop(), self.ui_loop())
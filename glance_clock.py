@@ -0,0 +1,63 @@
+import time
+
+## Local clock synced from Adafruit IO. Between syncs the time is derived
+## from the monotonic clock, scaled by the drift rate measured between the
+## last two syncs. Times are local wall-clock as Adafruit IO returns them and
+## tm_wday keeps its convention of 0 = Sunday.
+
+DRIFT_MIN_SPAN = 600 # Seconds between syncs needed before a drift rate is trusted
+DRIFT_LIMIT = 0.01 # Ignore rates more than 1% off, they come from bad syncs
+DST_MONTHS = (3, 4, 9, 10, 11)
+DST_RESYNC = 3600
+
+class ClockService:
+    def __init__(self, hw):
+        self._hw = hw
+        self._epoch = None
+        self._mono = None
+        self.rate = 1.0
+        self.isdst = -1
+        self.sync_count = 0
+
+    @property
+    def synced(self):
+        return self._epoch is not None
+
+    def sync(self, struct_time):
+        # isdst -1: the offset is already in the local time Adafruit IO sent,
+        # CPython's mktime would otherwise take another hour off for isdst 1
+        epoch = time.mktime(tuple(struct_time)[:8] + (-1,))
+        mono = self._hw.monotonic()
+        if self._epoch is not None and mono - self._mono >= DRIFT_MIN_SPAN:
+            rate = (epoch - self._epoch) / (mono - self._mono)
+            if abs(rate - 1.0) <= DRIFT_LIMIT:
+                self.rate = rate
+        if self.isdst != -1 and struct_time.tm_isdst != self.isdst:
+            print("Daylight saving time changed, isdst:", struct_time.tm_isdst)
+        self._epoch = epoch
+        self._mono = mono
+        self.isdst = struct_time.tm_isdst
+        self.sync_count += 1
+
+    def seconds_since_sync(self):
+        if self._mono is None:
+            return None
+        return self._hw.monotonic() - self._mono
+
+    def now(self):
+        if self._epoch is None:
+            return None
+        epoch = self._epoch + int((self._hw.monotonic() - self._mono) * self.rate)
+        t = time.localtime(epoch)
+        return time.struct_time((t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, (t.tm_wday + 1) % 7, t.tm_yday, self.isdst))
+
+    def in_dst_window(self, t):
+        # Most zones change on a Sunday between midnight and 4am in one of
+        # these months; the local offset can't be derived without tz rules.
+        return t.tm_mon in DST_MONTHS and t.tm_wday == 0 and t.tm_hour < 4
+
+    def needs_sync(self):
+        if self._epoch is None:
+            return True
+        t = self.now()
+        return self.in_dst_window(t) and self.seconds_since_sync() >= DST_RESYNC
@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import random
+import urllib.request
+import urllib.error
+
+from glance_headless import Response
+
+## Recorded HTTP fixtures and network profiles for the headless backend
+## (CPython only). Recorder and Replayer are route callables, so they plug
+## into HeadlessHardware(routes={"https://": ...}) in place of the synthetic
+## payloads:
+##
+##     python tools/record_fixtures.py fixtures/home   # once, with secrets.py
+##     replayer = Replayer("fixtures/home")
+##     hw = HeadlessHardware(routes={"https://": replayer}, profile=PROFILES["flaky"])
+##     PyGlancePortal(hardware=hw, config=replayer.config)
+##
+## Secret values from the config are replaced with REDACTED in the stored
+## URLs, bodies and config, and the Twitch access token is blanked, so a
+## fixture directory can be shared. Replay redacts incoming URLs the same
+## way, so the stored config (or any config with the same non-secret values)
+## finds its responses.
+
+REDACTED = "REDACTED"
+SECRET_KEYS = ("ssid", "password", "aio_username", "aio_key", "pirateweather_api_key", "twitch_api_key", "twitch_api_secret")
+TOKEN_PATTERN = re.compile(rb'("access_token"\s*:\s*")[^"]*(")')
+URL_SEPARATORS = re.compile(r"([/?&=])")
+MIN_BODY_SECRET = 8 # Shorter values are too likely to occur in a body by chance
+
+def secret_values(cfg):
+    # Longest first so a secret containing another is replaced whole
+    values = [str(cfg[x]) for x in SECRET_KEYS if x in cfg and len(str(cfg[x])) > 0 and cfg[x] != REDACTED]
+    return sorted(values, key=len, reverse=True)
+
+def redact_url(url, secrets):
+    # Only whole path segments and query values, so a short username can't
+    # mangle the host name
+    return "".join(REDACTED if x in secrets else x for x in URL_SEPARATORS.split(url))
+
+def redact_body(body, secrets):
+    body = TOKEN_PATTERN.sub(rb"\g<1>" + REDACTED.encode("utf-8") + rb"\g<2>", body)
+    for x in secrets:
+        if len(x) >= MIN_BODY_SECRET:
+            body = body.replace(x.encode("utf-8"), REDACTED.encode("utf-8"))
+    return body
+
+def fetch(method, url, headers):
+    # Minimal live transport for recording; error statuses are recorded too
+    request = urllib.request.Request(url, method=method, headers=headers or {}, data=b"" if method == "POST" else None)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as r:
+            return Response(r.status, r.read(), dict(r.headers))
+    except urllib.error.HTTPError as e:
+        return Response(e.code, e.read(), dict(e.headers))
+    except TimeoutError:
+        raise
+    except OSError as e:
+        # URLError for DNS failures and refused connections; the portal
+        # handles ConnectionError like the ESP32's "Failed to request hostname"
+        raise ConnectionError("Failed to request " + url.split("/")[2] + ": " + str(e)) from e
+
+class Recorder:
+    def __init__(self, directory, cfg, transport=fetch):
+        self.directory = directory
+        self._secrets = secret_values(cfg)
+        self._transport = transport
+        self._config = dict((k, REDACTED if k in SECRET_KEYS else v) for k, v in cfg.items())
+        self.index = {} # "METHOD url" -> list of {"status", "file"}
+
+    def __call__(self, method, url, headers):
+        response = self._transport(method, url, headers)
+        key = method + " " + redact_url(url, self._secrets)
+        body = redact_body(response.content, self._secrets)
+        name = "%03d.body" % (sum(len(x) for x in self.index.values()) + 1)
+        self.index.setdefault(key, []).append({"status": response.status_code, "file": name})
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), "wb") as f:
+            f.write(body)
+        return Response(response.status_code, response.content, response.headers)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "index.json"), "w") as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        with open(os.path.join(self.directory, "config.json"), "w") as f:
+            json.dump(self._config, f, indent=1, sort_keys=True)
+
+class Replayer:
+    ## Responses recorded for the same request are served in order and the
+    ## last one repeats. Unrecorded requests are a 404.
+    def __init__(self, directory, cfg=None):
+        self.directory = directory
+        with open(os.path.join(directory, "index.json")) as f:
+            self.index = json.load(f)
+        with open(os.path.join(directory, "config.json")) as f:
+            self.config = json.load(f)
+        self._secrets = secret_values(self.config if cfg is None else cfg)
+        self._bodies = {}
+        self._served = {}
+        self.misses = []
+
+    def _body(self, name):
+        if name not in self._bodies:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                self._bodies[name] = f.read()
+        return self._bodies[name]
+
+    def __call__(self, method, url, headers):
+        key = method + " " + redact_url(url, self._secrets)
+        entries = self.index.get(key)
+        if entries is None:
+            self.misses.append(key)
+            return Response(404, b"{}")
+        idx = self._served.get(key, 0)
+        self._served[key] = idx + 1
+        entry = entries[min(idx, len(entries) - 1)]
+        return Response(entry["status"], self._body(entry["file"]))
+
+class NetworkProfile:
+    ## Latency is per request and throughput in bytes per second, both can be
+    ## overridden per host. Faults are rates per request: timeout, broken_pipe
+    ## and connection raise the errors the ESP32SPI stack raises; truncate
+    ## cuts the body short at a random point.
+    FAULTS = (("timeout", TimeoutError, "Timed out waiting for SPI char"),
+              ("broken_pipe", BrokenPipeError, "Expected 01 but got 00"),
+              ("connection", ConnectionError, "Failed to request hostname"))
+
+    def __init__(self, latency=0.0, throughput=None, timeout=0.0, broken_pipe=0.0, connection=0.0, truncate=0.0, hosts=None, seed=None):
+        self.latency = latency
+        self.throughput = throughput
+        self.rates = {"timeout": timeout, "broken_pipe": broken_pipe, "connection": connection, "truncate": truncate}
+        self.hosts = {} if hosts is None else hosts
+        self.seed = seed
+        self._random = random.Random(seed)
+        self.faults = {}
+
+    def reset(self):
+        self._random = random.Random(self.seed)
+        self.faults = {}
+
+    def _get(self, host, name, default):
+        return self.hosts.get(host, {}).get(name, default)
+
+    def latency_for(self, host):
+        return self._get(host, "latency", self.latency)
+
+    def transfer_time(self, host, size):
+        throughput = self._get(host, "throughput", self.throughput)
+        if not throughput:
+            return 0.0
+        return size / throughput
+
+    def fault(self, host):
+        for name, error, message in self.FAULTS:
+            if self._random.random() < self._get(host, name, self.rates[name]):
+                self.faults[name] = self.faults.get(name, 0) + 1
+                raise error(message)
+
+    def truncate(self, host, content):
+        if len(content) < 2 or self._random.random() >= self._get(host, "truncate", self.rates["truncate"]):
+            return content
+        self.faults["truncate"] = self.faults.get("truncate", 0) + 1
+        return content[:self._random.randrange(1, len(content))]
+
+## ESP32SPI moves roughly 20-60 KB/s over WiFi in practice
+PROFILES = {
+    "ideal": NetworkProfile(),
+    "wifi": NetworkProfile(latency=0.08, throughput=40000, seed=1),
+    "slow": NetworkProfile(latency=0.4, throughput=12000, hosts={"site.web.api.espn.com": {"latency": 0.8}}, seed=1),
+    "flaky": NetworkProfile(latency=0.08, throughput=40000, timeout=0.03, broken_pipe=0.01, connection=0.01, truncate=0.03, seed=1),
+}
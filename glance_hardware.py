@@ -0,0 +1,116 @@
+import os
+import time
+import gc
+import board
+import microcontroller
+import rtc
+import displayio
+import digitalio
+import terminalio
+import busio
+import neopixel
+from adafruit_display_text import label
+
+## PyPortal hardware backend. PyGlancePortal only talks to the board through
+## this object, so a different backend (see glance_headless.py) can be swapped in.
+## The ESP32 and requests libraries are imported when WiFi is first brought
+## up, after the warm-start snapshot is already on screen.
+class PyPortalHardware:
+    Group = displayio.Group
+    TileGrid = displayio.TileGrid
+    ColorConverter = displayio.ColorConverter
+    terminal_group = displayio.CIRCUITPYTHON_TERMINAL
+    idle_status = None # Set by esp32()
+
+    def __init__(self):
+        # PyPortal Board Setup
+        self.display = board.DISPLAY
+        self.status_light = neopixel.NeoPixel(board.NEOPIXEL, 1, brightness=0.2)
+        self.led = digitalio.DigitalInOut(board.D13)
+        self.led.direction = digitalio.Direction.OUTPUT
+
+        # PyPortal ESP32 Setup
+        self._esp32_cs = digitalio.DigitalInOut(board.ESP_CS)
+        self._esp32_ready = digitalio.DigitalInOut(board.ESP_BUSY)
+        self._esp32_reset = digitalio.DigitalInOut(board.ESP_RESET)
+        self._spi = busio.SPI(board.SCK, board.MOSI, board.MISO)
+
+        self.nvm = microcontroller.nvm
+        self._touchscreen = None
+
+    def esp32(self):
+        from adafruit_esp32spi import adafruit_esp32spi
+        self.idle_status = adafruit_esp32spi.WL_IDLE_STATUS
+        return adafruit_esp32spi.ESP_SPIcontrol(self._spi, self._esp32_cs, self._esp32_ready, self._esp32_reset)
+
+    def socket_pool(self, esp):
+        try:
+            import adafruit_connection_manager
+            return adafruit_connection_manager.get_radio_socketpool(esp), adafruit_connection_manager.get_radio_ssl_context(esp)
+        except ImportError:
+            # Older adafruit_requests releases, same pairing set_socket() used
+            import adafruit_requests as requests
+            from adafruit_esp32spi import adafruit_esp32spi_socket as socket
+            socket.set_interface(esp)
+            return socket, requests._FakeSSLContext(esp)
+
+    def session(self, pool, ssl_context):
+        import adafruit_requests as requests
+        return requests.Session(pool, ssl_context)
+
+    def touch_point(self):
+        if self._touchscreen is None:
+            # Only the async engine polls the touchscreen
+            import adafruit_touchscreen
+            self._touchscreen = adafruit_touchscreen.Touchscreen(board.TOUCH_XL, board.TOUCH_XR, board.TOUCH_YD, board.TOUCH_YU,
+                                                                 calibration=((5200, 59000), (5800, 57000)), size=(320, 240))
+        return self._touchscreen.touch_point
+
+    def label(self, text):
+        return label.Label(terminalio.FONT, text=text)
+
+    def open_file(self, path, mode="rb"):
+        return open(path, mode)
+
+    def listdir(self, path):
+        return os.listdir(path)
+
+    def load_bitmap(self, file):
+        return displayio.OnDiskBitmap(file)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def monotonic_ns(self):
+        # time.monotonic() is a float and loses precision after a few hours up
+        return time.monotonic_ns()
+
+    def time(self):
+        return time.time()
+
+    def set_time(self, struct_time):
+        rtc.RTC().datetime = struct_time
+
+    def mem_alloc(self):
+        return gc.mem_alloc()
+
+    def mem_free(self):
+        return gc.mem_free()
+
+    def largest_free_block(self):
+        # No API for this; binary search the largest bytearray that fits.
+        # Failed attempts run a collection, so only call it in debug mode.
+        lo = 0
+        hi = gc.mem_free()
+        while hi - lo > 256:
+            mid = (lo + hi) // 2
+            try:
+                b = bytearray(mid)
+                del b
+                lo = mid
+            except MemoryError:
+                hi = mid
+        return lo
@@ -0,0 +1,622 @@
+import os
+import io
+import time
+import json
+import struct
+import tracemalloc
+
+## Headless hardware backend for running PyGlancePortal under CPython.
+## Mirrors the small slice of displayio/ESP32 that pyglanceportal.py uses:
+## the display tree is rendered into an RGB framebuffer, LED/NeoPixel pins
+## are plain attributes and the ESP32 link answers from a route table with
+## a configurable latency.
+
+class Group:
+    def __init__(self, x=0, y=0, scale=1):
+        self.x = x
+        self.y = y
+        self.scale = scale
+        self.hidden = False
+        self._children = []
+
+    def _adopt(self, layer):
+        # displayio only lets a layer belong to one group at a time
+        if getattr(layer, "_in_group", False):
+            raise ValueError("Layer already in a group")
+        layer._in_group = True
+
+    def append(self, layer):
+        self._adopt(layer)
+        self._children.append(layer)
+
+    def insert(self, index, layer):
+        self._adopt(layer)
+        self._children.insert(index, layer)
+
+    def remove(self, layer):
+        self._children.remove(layer)
+        layer._in_group = False
+
+    def pop(self, index=-1):
+        layer = self._children.pop(index)
+        layer._in_group = False
+        return layer
+
+    def __len__(self):
+        return len(self._children)
+
+    def __getitem__(self, index):
+        return self._children[index]
+
+    def __iter__(self):
+        return iter(self._children)
+
+    def render(self, fb, x, y, scale):
+        if self.hidden:
+            return
+        x = x + self.x * scale
+        y = y + self.y * scale
+        scale = scale * self.scale
+        for child in self._children:
+            child.render(fb, x, y, scale)
+
+class Bitmap:
+    def __init__(self, width, height, pixels=None):
+        self.width = width
+        self.height = height
+        if pixels is None:
+            pixels = bytearray(width * height * 3)
+        self._pixels = pixels
+
+    def pixel(self, x, y):
+        i = (y * self.width + x) * 3
+        return self._pixels[i], self._pixels[i+1], self._pixels[i+2]
+
+def _bmp_palette(data, offset, count):
+    palette = []
+    for i in range(count):
+        b, g, r = data[offset+i*4], data[offset+i*4+1], data[offset+i*4+2]
+        palette.append((r, g, b))
+    return palette
+
+def read_bmp(data):
+    if data[:2] != b"BM":
+        raise ValueError("Not a BMP file")
+    pixel_offset = struct.unpack_from("<I", data, 10)[0]
+    header_size = struct.unpack_from("<I", data, 14)[0]
+    width, height = struct.unpack_from("<ii", data, 18)
+    bpp = struct.unpack_from("<H", data, 28)[0]
+    colors = struct.unpack_from("<I", data, 46)[0] if header_size >= 40 else 0
+    top_down = height < 0
+    height = abs(height)
+    palette = None
+    if bpp <= 8:
+        palette = _bmp_palette(data, 14 + header_size, colors or (1 << bpp))
+    stride = ((width * bpp + 31) // 32) * 4
+    pixels = bytearray(width * height * 3)
+    for row in range(height):
+        src = pixel_offset + (row if top_down else height - 1 - row) * stride
+        for col in range(width):
+            if bpp == 24 or bpp == 32:
+                i = src + col * (bpp // 8)
+                r, g, b = data[i+2], data[i+1], data[i]
+            elif bpp == 16:
+                v = data[src+col*2] | (data[src+col*2+1] << 8)
+                r, g, b = ((v >> 10) & 0x1F) << 3, ((v >> 5) & 0x1F) << 3, (v & 0x1F) << 3
+            else:
+                bit = col * bpp
+                v = (data[src + bit // 8] >> (8 - bpp - bit % 8)) & ((1 << bpp) - 1)
+                r, g, b = palette[v] if v < len(palette) else (0, 0, 0)
+            o = (row * width + col) * 3
+            pixels[o], pixels[o+1], pixels[o+2] = r, g, b
+    return Bitmap(width, height, pixels)
+
+def write_bmp(bitmap):
+    stride = ((bitmap.width * 3 + 3) // 4) * 4
+    pad = bytes(stride - bitmap.width * 3)
+    rows = []
+    for row in range(bitmap.height - 1, -1, -1):
+        line = bytearray()
+        for col in range(bitmap.width):
+            r, g, b = bitmap.pixel(col, row)
+            line.extend((b, g, r))
+        rows.append(bytes(line) + pad)
+    data = b"".join(rows)
+    header = b"BM" + struct.pack("<IHHI", 54 + len(data), 0, 0, 54)
+    header += struct.pack("<IiiHHIIiiII", 40, bitmap.width, bitmap.height, 1, 24, 0, len(data), 2835, 2835, 0, 0)
+    return header + data
+
+class ColorConverter:
+    pass
+
+class TileGrid:
+    def __init__(self, bitmap, pixel_shader=None, width=1, height=1, tile_width=None, tile_height=None, default_tile=0, x=0, y=0):
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+        self.width = width
+        self.height = height
+        self.tile_width = bitmap.width if tile_width is None else tile_width
+        self.tile_height = bitmap.height if tile_height is None else tile_height
+        self.x = x
+        self.y = y
+        self.hidden = False
+        self._tiles = [default_tile] * (width * height)
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            index = index[1] * self.width + index[0]
+        return self._tiles[index]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, tuple):
+            index = index[1] * self.width + index[0]
+        self._tiles[index] = value
+
+    def render(self, fb, x, y, scale):
+        if self.hidden:
+            return
+        bmp = self.bitmap
+        tiles_per_row = max(1, bmp.width // self.tile_width)
+        for ty in range(self.height):
+            for tx in range(self.width):
+                tile = self._tiles[ty * self.width + tx]
+                sx = (tile % tiles_per_row) * self.tile_width
+                sy = (tile // tiles_per_row) * self.tile_height
+                ox = x + (self.x + tx * self.tile_width) * scale
+                oy = y + (self.y + ty * self.tile_height) * scale
+                for py in range(self.tile_height):
+                    for px in range(self.tile_width):
+                        fb.fill(ox + px * scale, oy + py * scale, scale, scale, bmp.pixel(sx + px, sy + py))
+
+class Label:
+    ## terminalio.FONT cells are 6x12. Glyphs are drawn as solid blocks which
+    ## is enough to see layout, overlap and clipping in a rendered frame.
+    glyph_width = 6
+    glyph_height = 12
+
+    def __init__(self, font=None, text="", color=0xFFFFFF, x=0, y=0):
+        self.font = font
+        self.text = text
+        self.color = color
+        self.x = x
+        self.y = y
+        self.hidden = False
+
+    def render(self, fb, x, y, scale):
+        if self.hidden:
+            return
+        rgb = ((self.color >> 16) & 0xFF, (self.color >> 8) & 0xFF, self.color & 0xFF)
+        for line_no, line in enumerate(self.text.split("\n")):
+            top = y + (self.y - self.glyph_height // 2 + line_no * self.glyph_height) * scale
+            for col, ch in enumerate(line):
+                if ch != " ":
+                    left = x + (self.x + col * self.glyph_width) * scale
+                    fb.fill(left, top + 2 * scale, (self.glyph_width - 1) * scale, (self.glyph_height - 4) * scale, rgb)
+
+class FramebufferDisplay:
+    def __init__(self, width=320, height=240):
+        self.width = width
+        self.height = height
+        self.brightness = 1
+        self.auto_refresh = True
+        self.refresh_count = 0
+        self.buffer = bytearray(width * height * 3)
+        self._blank = bytes(len(self.buffer)) # Cleared from this so a refresh allocates nothing
+        self._root_group = None
+
+    @property
+    def root_group(self):
+        return self._root_group
+
+    @root_group.setter
+    def root_group(self, group):
+        self._root_group = group
+        if self.auto_refresh:
+            self.refresh()
+
+    def fill(self, x, y, w, h, rgb):
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + w), min(self.height, y + h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        row = bytes(rgb) * (x1 - x0)
+        for py in range(y0, y1):
+            i = (py * self.width + x0) * 3
+            self.buffer[i:i+len(row)] = row
+
+    def refresh(self):
+        memoryview(self.buffer)[:] = self._blank
+        if self._root_group is not None and self._root_group is not TERMINAL:
+            self._root_group.render(self, 0, 0, 1)
+        self.refresh_count += 1
+        return True
+
+    def save_ppm(self, path):
+        with open(path, "wb") as f:
+            f.write(b"P6\n%d %d\n255\n" % (self.width, self.height))
+            f.write(self.buffer)
+
+TERMINAL = Group()
+
+class Pin:
+    def __init__(self):
+        self.value = False
+
+class NeoPixel(list):
+    def __init__(self, n=1, brightness=1.0):
+        super().__init__([(0, 0, 0)] * n)
+        self.brightness = brightness
+
+    def fill(self, color):
+        for i in range(len(self)):
+            self[i] = color
+
+class Response:
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.closed = False
+        self._release = None
+        self._socket = None
+
+    def _recv(self, data):
+        # The body goes through the socket as it is read, like on the device
+        if self._socket is not None:
+            self._socket.recv_into(data, len(data))
+        return data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def text(self):
+        return self._recv(self.content).decode("utf-8")
+
+    def json(self):
+        return json.loads(self._recv(self.content))
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for i in range(0, len(self.content), chunk_size):
+            yield self._recv(self.content[i:i+chunk_size])
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if self._release is not None:
+                self._release()
+
+class FakeESP32:
+    status = 0
+    firmware_version = bytearray(b"1.7.7\x00")
+    MAC_address = bytearray(b"\x00\x00\x5e\x00\x53\x01")
+    ssid = bytearray(b"headless")
+    rssi = -40
+    ip_address = bytearray(b"\x7f\x00\x00\x01")
+
+    def __init__(self, latency=0.0, delay=time.sleep):
+        self.latency = latency
+        self._delay = delay
+        self.connected = False
+        self.reset_count = 0
+
+    @property
+    def is_connected(self):
+        return self.connected
+
+    def scan_networks(self):
+        return [{"ssid": self.ssid, "rssi": self.rssi}]
+
+    def connect_AP(self, ssid, password):
+        self._delay(self.latency)
+        self.connected = True
+
+    def pretty_ip(self, ip):
+        return "%d.%d.%d.%d" % tuple(ip)
+
+    def reset(self):
+        self.reset_count += 1
+        self.connected = False
+
+class FakeSocket:
+    def __init__(self, pool):
+        self._pool = pool
+        self.closed = False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._pool.open_sockets -= 1
+
+    def recv_into(self, buffer, nbytes=0):
+        # Nothing is copied, the response hands the body over directly
+        return nbytes or len(buffer)
+
+class FakeSocketPool:
+    ## The ESP32 coprocessor only has a handful of sockets; every new one
+    ## costs a TLS handshake.
+    MAX_SOCKETS = 4
+    AF_INET = 2
+    SOCK_STREAM = 1
+
+    def __init__(self, esp, handshake_latency=0.0, delay=time.sleep):
+        self._esp = esp
+        self.handshake_latency = handshake_latency
+        self._delay = delay
+        self.open_sockets = 0
+        self.opened = 0
+
+    def getaddrinfo(self, host, port, family=0, socktype=0, proto=0, flags=0):
+        return [(self.AF_INET, self.SOCK_STREAM, 0, "", (host, port))]
+
+    def socket(self, family=AF_INET, type=SOCK_STREAM, proto=0):
+        if not self._esp.is_connected:
+            raise ConnectionError("Failed to request hostname")
+        if self.open_sockets >= self.MAX_SOCKETS:
+            raise RuntimeError("No sockets available")
+        self._delay(self.handshake_latency)
+        self.open_sockets += 1
+        self.opened += 1
+        return FakeSocket(self)
+
+class FakeSession:
+    ## Routes map a URL prefix to a payload: bytes/str are served verbatim,
+    ## dicts and lists are JSON encoded and callables are called with
+    ## (method, url, headers) and may return any of those or a Response.
+    ## The longest matching prefix wins; anything unrouted is a 404.
+    ## Sockets are kept alive per host and reused once the response that
+    ## held them is closed, like adafruit_requests.Session.
+    ## A NetworkProfile (glance_fixtures.py) adds per-host latency,
+    ## throughput limits, truncated bodies and injected errors.
+    def __init__(self, pool, routes, latency=0.0, profile=None, delay=time.sleep):
+        self._pool = pool
+        self.routes = routes
+        self.latency = latency
+        self.profile = profile
+        self._delay = delay
+        self.request_count = 0
+        self.bytes_received = 0
+        self._open_sockets = {} # host -> list of [socket, free]
+        self._last_response = None
+
+    def _free_sockets(self):
+        for host in list(self._open_sockets):
+            entries = self._open_sockets[host]
+            for entry in [x for x in entries if x[1]]:
+                entry[0].close()
+                entries.remove(entry)
+            if len(entries) == 0:
+                del self._open_sockets[host]
+
+    def _get_socket(self, host):
+        entries = self._open_sockets.setdefault(host, [])
+        for entry in entries:
+            if entry[1] and not entry[0].closed:
+                entry[1] = False
+                return entry
+        # Like adafruit_connection_manager: when no socket can be opened the
+        # idle ones are closed and it is tried once more
+        try:
+            sock = self._pool.socket(self._pool.AF_INET, self._pool.SOCK_STREAM)
+        except RuntimeError as first:
+            if not any(x[1] for entries in self._open_sockets.values() for x in entries):
+                raise RuntimeError("Error connecting socket: " + str(first)) from first
+            self._free_sockets()
+            try:
+                sock = self._pool.socket(self._pool.AF_INET, self._pool.SOCK_STREAM)
+            except RuntimeError as e:
+                raise RuntimeError("Error connecting socket: " + str(e) + ", first error: " + str(first)) from e
+        entry = [sock, False]
+        self._open_sockets.setdefault(host, []).append(entry)
+        return entry
+
+    def release(self, entry):
+        entry[1] = True
+
+    def request(self, method, url, headers=None, data=None, json=None, **kw):
+        if self._last_response is not None:
+            self._last_response.close()
+            self._last_response = None
+        host = url.split("/")[2]
+        entry = self._get_socket(host)
+        self.request_count += 1
+        if self.profile is None:
+            self._delay(self.latency)
+        else:
+            self._delay(self.latency + self.profile.latency_for(host))
+            try:
+                self.profile.fault(host)
+            except OSError:
+                # The socket is gone after an SPI or connection error
+                entry[0].close()
+                self._open_sockets[host].remove(entry)
+                raise
+        try:
+            response = route_request(self.routes, method, url, headers or {})
+        except BaseException:
+            # A route that raises (a live transport that can't connect) must
+            # not keep the socket, or the pool runs dry
+            entry[0].close()
+            self._open_sockets[host].remove(entry)
+            raise
+        if self.profile is not None:
+            response.content = self.profile.truncate(host, response.content)
+            self._delay(self.profile.transfer_time(host, len(response.content)))
+        response._release = lambda: self.release(entry)
+        self.bytes_received += len(response.content)
+        response._socket = entry[0]
+        self._last_response = response
+        return response
+
+    def get(self, url, headers=None, **kw):
+        return self.request("GET", url, headers=headers, **kw)
+
+    def post(self, url, headers=None, **kw):
+        return self.request("POST", url, headers=headers, **kw)
+
+def _json_dumps(payload):
+    return json.dumps(payload).encode("utf-8")
+
+def match_route(routes, url):
+    best = None
+    for prefix in routes:
+        if url.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return best
+
+def route_request(routes, method, url, headers):
+    # A fresh Response for the longest matching route, see FakeSession
+    prefix = match_route(routes, url)
+    if prefix is None:
+        payload = Response(404, b"{}")
+    else:
+        payload = routes[prefix]
+    if callable(payload):
+        payload = payload(method, url, headers)
+    if isinstance(payload, Response):
+        return Response(payload.status_code, payload.content, payload.headers)
+    if isinstance(payload, (bytes, bytearray)):
+        return Response(200, bytes(payload))
+    if isinstance(payload, str):
+        return Response(200, payload.encode("utf-8"))
+    return Response(200, _json_dumps(payload))
+
+class TrackedFile:
+    def __init__(self, hw, f):
+        self._hw = hw
+        self._f = f
+        self.closed = False
+        hw.open_files += 1
+
+    def read(self, *args):
+        return self._f.read(*args)
+
+    def write(self, data):
+        return self._f.write(data)
+
+    def __iter__(self):
+        return iter(self._f)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._hw.open_files -= 1
+            self._f.close()
+
+class HeadlessHardware:
+    Group = Group
+    TileGrid = TileGrid
+    ColorConverter = ColorConverter
+    terminal_group = TERMINAL
+    idle_status = FakeESP32.status
+
+    ## icon_root maps "/icons/..." onto a directory on disk. Without one every
+    ## icon resolves to a blank 32x32 bitmap so layouts can be exercised with
+    ## no assets at all. sleep_scale shrinks the cosmetic/back-off sleeps in
+    ## pyglanceportal.py; network latency is simulated separately.
+    ## With virtual_time on, sleeps and network delays are not waited out but
+    ## added to monotonic() and time(), so long back-offs and slow network
+    ## profiles run at full speed.
+    ## Pass the nvm bytearray of a previous instance to simulate a reboot.
+    def __init__(self, routes=None, latency=0.0, icon_root=None, sleep_scale=0.0, heap_size=150000, width=320, height=240, nvm=None, handshake_latency=0.0, profile=None, virtual_time=False):
+        self.display = FramebufferDisplay(width, height)
+        self.status_light = NeoPixel(1, brightness=0.2)
+        self.led = Pin()
+        self.routes = {} if routes is None else routes
+        self.latency = latency
+        self.icon_root = icon_root
+        self.sleep_scale = sleep_scale
+        self.heap_size = heap_size
+        self.profile = profile
+        self.virtual_time = virtual_time
+        self.elapsed = 0.0 # Virtual seconds passed
+        self.esp = FakeESP32(latency, self.delay)
+        self.handshake_latency = handshake_latency
+        self.pool = None
+        self.http = None
+        self._request_count = 0 # Requests made by sessions before the current one
+        self.bitmap_loads = 0
+        self.open_files = 0
+        self.nvm = bytearray(8192) if nvm is None else nvm
+        self.touches = [] # (x, y, pressure) points handed out by touch_point()
+
+    def esp32(self):
+        return self.esp
+
+    def socket_pool(self, esp):
+        self.pool = FakeSocketPool(esp, self.handshake_latency, self.delay)
+        return self.pool, None
+
+    def session(self, pool, ssl_context):
+        # A new session per (re)connect, like the device
+        self._request_count = self.request_count
+        self.http = FakeSession(pool, self.routes, self.latency, self.profile, self.delay)
+        return self.http
+
+    @property
+    def request_count(self):
+        # Requests over every session this hardware has handed out
+        return self._request_count + (0 if self.http is None else self.http.request_count)
+
+    def touch_point(self):
+        if len(self.touches) == 0:
+            return None
+        return self.touches.pop(0)
+
+    def label(self, text):
+        return Label(None, text=text)
+
+    def open_file(self, path, mode="rb"):
+        if self.icon_root is None:
+            if not path.endswith(".bmp") or "r" not in mode:
+                raise OSError(2, "No such file/directory", path)
+            return TrackedFile(self, io.BytesIO(write_bmp(Bitmap(32, 32))))
+        return TrackedFile(self, open(self.icon_root.rstrip("/") + path, mode))
+
+    def listdir(self, path):
+        if self.icon_root is None:
+            raise OSError(2, "No such file/directory", path)
+        return os.listdir(self.icon_root.rstrip("/") + path)
+
+    def load_bitmap(self, file):
+        self.bitmap_loads += 1
+        return read_bmp(file.read())
+
+    def delay(self, seconds):
+        # Network and connection delays
+        if self.virtual_time:
+            self.elapsed += seconds
+        elif seconds > 0:
+            time.sleep(seconds)
+
+    def sleep(self, seconds):
+        if self.virtual_time:
+            self.elapsed += seconds
+        elif self.sleep_scale:
+            time.sleep(seconds * self.sleep_scale)
+
+    def monotonic(self):
+        return time.monotonic() + self.elapsed
+
+    def time(self):
+        return time.time() + self.elapsed
+
+    def set_time(self, struct_time):
+        pass
+
+    def mem_alloc(self):
+        if not tracemalloc.is_tracing():
+            return 0
+        return tracemalloc.get_traced_memory()[0]
+
+    def mem_free(self):
+        return self.heap_size - self.mem_alloc()
+
+    def largest_free_block(self):
+        return self.mem_free()
+
+    def monotonic_ns(self):
+        return time.monotonic_ns() + int(self.elapsed * 1000000000)
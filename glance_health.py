@@ -0,0 +1,111 @@
+import random
+
+## Per-source health tracking. A failing source is not retried by sleeping;
+## its next refresh is pushed back instead and the loop moves on with the
+## last good value still on screen.
+##
+## Each failure in a row doubles the retry delay from backoff up to
+## backoff_max, with jitter so sources that failed together don't retry
+## together. After open_after failures in a row the circuit opens and the
+## source is left alone for open_timeout seconds (doubling up to
+## open_timeout_max on every failed probe). The first attempt after that is
+## a half-open probe: success closes the circuit, failure opens it again.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class SourceHealth:
+    def __init__(self, name, backoff=30, backoff_max=300, open_after=3, open_timeout=600, open_timeout_max=3600, jitter=0.2):
+        self.name = name
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.open_after = open_after
+        self.open_timeout = open_timeout
+        self.open_timeout_max = open_timeout_max
+        self.jitter = jitter
+        self.state = CLOSED
+        self.failures = 0 # In a row
+        self.current_timeout = open_timeout
+        self.retry_at = 0
+        self.attempts = 0
+        self.total_failures = 0
+        self.opened = 0
+
+    def allow(self, now):
+        if self.state == OPEN:
+            if now < self.retry_at:
+                return False
+            self.state = HALF_OPEN
+        return True
+
+    def _jittered(self, delay):
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def success(self, now):
+        self.attempts += 1
+        self.failures = 0
+        self.current_timeout = self.open_timeout
+        if self.state != CLOSED:
+            print("Circuit closed for", self.name)
+        self.state = CLOSED
+
+    def failure(self, now):
+        # Returns the number of seconds until the source should be retried
+        self.attempts += 1
+        self.total_failures += 1
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self.current_timeout = min(self.current_timeout * 2, self.open_timeout_max)
+        if self.state == HALF_OPEN or self.failures >= self.open_after:
+            if self.state != OPEN:
+                self.opened += 1
+            self.state = OPEN
+            delay = self._jittered(self.current_timeout)
+            print("Circuit open for", self.name, "retrying in", int(delay), "s")
+        else:
+            delay = self._jittered(min(self.backoff * 2 ** (self.failures - 1), self.backoff_max))
+        self.retry_at = now + delay
+        return delay
+
+    def failure_rate(self):
+        if self.attempts == 0:
+            return 0.0
+        return self.total_failures / self.attempts
+
+class HealthTracker:
+    def __init__(self, **kwargs):
+        self._defaults = kwargs
+        self._sources = {}
+        self.blocked_time = 0.0 # Seconds the loop spent sleeping
+        self.blocked = {} # reason -> seconds
+
+    def add(self, name, **kwargs):
+        options = dict(self._defaults)
+        options.update(kwargs)
+        source = SourceHealth(name, **options)
+        self._sources[name] = source
+        return source
+
+    def get(self, name):
+        return self._sources[name]
+
+    def allow(self, name, now):
+        return self._sources[name].allow(now)
+
+    def success(self, name, now):
+        self._sources[name].success(now)
+
+    def failure(self, name, now):
+        return self._sources[name].failure(now)
+
+    def add_blocked(self, reason, seconds):
+        self.blocked_time += seconds
+        self.blocked[reason] = self.blocked.get(reason, 0.0) + seconds
+
+    def stats(self):
+        lines = []
+        for x in self._sources.values():
+            lines.append("%s: %s %d/%d failed (%d%%) opened %d" % (x.name, x.state, x.total_failures, x.attempts, int(x.failure_rate() * 100), x.opened))
+        lines.append("blocked: %.1fs %s" % (self.blocked_time, ", ".join("%s %.1fs" % (k, v) for k, v in self.blocked.items())))
+        return "\n".join(lines)
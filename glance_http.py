@@ -0,0 +1,111 @@
+## Managed HTTP session. One requests.Session is kept for the life of the
+## WiFi connection so sockets are kept alive and reused per host instead of
+## doing a fresh TLS handshake on the ESP32 for every request. Sockets are
+## opened through a counting pool that caps how many can be open at once,
+## which also gives the handshake/reuse/exhaustion counters.
+##
+## Callers should use responses as context managers so they are released
+## (drained and returned to the pool) even when parsing fails:
+##     with session.get(url) as r:
+##         return parse(r.json())
+
+class CountingSocket:
+    def __init__(self, pool, sock):
+        self._pool = pool
+        self._sock = sock
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+    def recv_into(self, buffer, nbytes=0):
+        size = self._sock.recv_into(buffer, nbytes)
+        self._pool.bytes_received += size
+        return size
+
+    def recv(self, bufsize):
+        data = self._sock.recv(bufsize)
+        self._pool.bytes_received += len(data)
+        return data
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._pool.open_sockets -= 1
+        self._sock.close()
+
+class CountingSocketPool:
+    def __init__(self, pool, max_sockets):
+        self._pool = pool
+        self.max_sockets = max_sockets
+        self.open_sockets = 0
+        self.opened = 0
+        self.refused = 0
+        self.bytes_received = 0
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def socket(self, *args, **kwargs):
+        if self.open_sockets >= self.max_sockets:
+            self.refused += 1
+            raise RuntimeError("Out of sockets")
+        sock = self._pool.socket(*args, **kwargs)
+        self.open_sockets += 1
+        self.opened += 1
+        return CountingSocket(self, sock)
+
+class ManagedSession:
+    def __init__(self, hw, max_sockets=4):
+        self._hw = hw
+        self.max_sockets = max_sockets
+        self._pool = None
+        self._session = None
+        self.requests = 0
+        self.handshakes = 0
+        self.reused = 0
+        self.exhausted = 0
+        self.hosts = {}
+        self._received = 0
+
+    def attach(self, pool, ssl_context):
+        # Called after every (re)connect; sockets from a previous connection
+        # are gone with the ESP32 reset but the counters carry on.
+        if self._pool is not None:
+            self._received += self._pool.bytes_received
+        self._pool = CountingSocketPool(pool, self.max_sockets)
+        self._session = self._hw.session(self._pool, ssl_context)
+
+    @property
+    def bytes_received(self):
+        if self._pool is None:
+            return self._received
+        return self._received + self._pool.bytes_received
+
+    def request(self, method, url, **kwargs):
+        host = url.split("/")[2] if "://" in url else url
+        self.requests += 1
+        self.hosts[host] = self.hosts.get(host, 0) + 1
+        opened = self._pool.opened
+        refused = self._pool.refused
+        # When the pool refuses a socket the session closes its idle ones and
+        # tries again by itself, so this only counts it
+        try:
+            r = self._session.request(method, url, **kwargs)
+        finally:
+            if self._pool.refused != refused:
+                self.exhausted += 1
+        if self._pool.opened == opened:
+            self.reused += 1
+        else:
+            self.handshakes += self._pool.opened - opened
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        return "http: " + str(self.requests) + " req " + str(self.handshakes) + " new " + str(self.reused) + " reused " + str(self.exhausted) + " exhausted " + str(self._pool.open_sockets if self._pool is not None else 0) + " open"
@@ -0,0 +1,135 @@
+## Icon cache and sprite-sheet atlases.
+##
+## Each icon directory is indexed once: from a generated atlas.idx (one icon
+## name per line, line number = tile index into atlas.bmp) when present, or
+## from a directory listing otherwise. Resolving an icon is then a dict
+## lookup and missing icons go straight to the default without touching
+## the filesystem.
+##
+## Opened bitmaps are kept in an LRU cache bounded by a byte budget. Every
+## OnDiskBitmap pins an open file with its own sector buffer, so the cost of
+## an entry is the open file, not the pixels. Entries that are on screen are
+## reference counted and never evicted; evicted entries have their file closed.
+
+ATLAS_NAME = "atlas"
+TILE_SIZE = 32
+FILE_COST = 576 # 512 byte sector buffer plus file and bitmap objects
+
+class IconCache:
+    def __init__(self, hw, budget=16*FILE_COST, use_atlas=True):
+        self._hw = hw
+        self.budget = budget
+        self.use_atlas = use_atlas
+        self.pixel_shader = hw.ColorConverter()
+        self._entries = {} # file path -> [bitmap, file, refs]
+        self._order = [] # least recently used first
+        self._dirs = {}
+        self.used = 0
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def _load_index(self, directory):
+        if self.use_atlas:
+            try:
+                f = self._hw.open_file(directory + "/" + ATLAS_NAME + ".idx", "r")
+                try:
+                    index = {}
+                    for line in f:
+                        name = line.strip()
+                        if len(name) > 0:
+                            index[name] = len(index)
+                    return index
+                finally:
+                    f.close()
+            except OSError:
+                pass
+        try:
+            names = self._hw.listdir(directory)
+        except OSError:
+            return None
+        index = {}
+        for x in names:
+            if x.endswith(".bmp") and x != ATLAS_NAME + ".bmp":
+                index[x[:-4]] = None
+        return index
+
+    def resolve(self, path):
+        # Returns (file path, tile index or None) or None if the icon is known
+        # not to exist. Directories that can't be listed are probed on load.
+        directory, _, name = path.rpartition("/")
+        if name.endswith(".bmp"):
+            name = name[:-4]
+        if directory not in self._dirs:
+            self._dirs[directory] = self._load_index(directory)
+        index = self._dirs[directory]
+        if index is None:
+            return path, None
+        if name not in index:
+            return None
+        tile = index[name]
+        if tile is None:
+            return path, None
+        return directory + "/" + ATLAS_NAME + ".bmp", tile
+
+    def _open(self, file_path):
+        entry = self._entries.get(file_path)
+        if entry is not None:
+            self.hits += 1
+            self._order.remove(file_path)
+            self._order.append(file_path)
+            return entry
+        self._evict(FILE_COST)
+        f = self._hw.open_file(file_path, "rb")
+        try:
+            bitmap = self._hw.load_bitmap(f)
+        except (OSError, ValueError):
+            f.close()
+            raise OSError("Unreadable icon " + file_path)
+        self.loads += 1
+        entry = [bitmap, f, 0]
+        self._entries[file_path] = entry
+        self._order.append(file_path)
+        self.used += FILE_COST
+        return entry
+
+    def _evict(self, needed):
+        idx = 0
+        while self.used + needed > self.budget and idx < len(self._order):
+            file_path = self._order[idx]
+            entry = self._entries[file_path]
+            if entry[2] > 0:
+                idx += 1
+                continue
+            self._order.pop(idx)
+            del self._entries[file_path]
+            entry[1].close()
+            self.used -= FILE_COST
+            self.evictions += 1
+
+    def acquire(self, path, default_path):
+        # Returns (file path, bitmap, tile). The file path must be handed back
+        # to release() once the bitmap is no longer displayed.
+        resolved = self.resolve(path)
+        try:
+            if resolved is None:
+                raise OSError("No icon " + path)
+            entry = self._open(resolved[0])
+        except OSError:
+            resolved = self.resolve(default_path)
+            if resolved is None:
+                raise OSError("No icon " + default_path)
+            entry = self._open(resolved[0])
+        entry[2] += 1
+        return resolved[0], entry[0], resolved[1]
+
+    def release(self, file_path):
+        entry = self._entries.get(file_path)
+        if entry is not None and entry[2] > 0:
+            entry[2] -= 1
+
+    def sprite(self, bitmap, tile=None, x=0, y=0):
+        if tile is None:
+            return self._hw.TileGrid(bitmap, pixel_shader=self.pixel_shader, x=x, y=y)
+        return self._hw.TileGrid(bitmap, pixel_shader=self.pixel_shader, width=1, height=1,
+                                 tile_width=TILE_SIZE, tile_height=TILE_SIZE, default_tile=tile, x=x, y=y)
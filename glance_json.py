@@ -0,0 +1,206 @@
+## Streaming, key-selective JSON extraction.
+## Responses are read in chunks and only the values under the requested
+## paths are built; everything else is scanned past byte by byte, so peak
+## heap depends on what is selected rather than on the payload size.
+##
+## Paths are dotted strings: "daily.data.*.icon", "sports.0.leagues.0.events.0.status".
+## A number selects one array index and "*" selects every key/index. The
+## result mirrors the shape of the full document, so parse_* code written
+## against r.json() works unchanged on it.
+
+_WS = b" \t\r\n"
+_ESCAPES = {98: "\b", 102: "\f", 110: "\n", 114: "\r", 116: "\t"}
+
+def compile_paths(paths):
+    trie = {}
+    for path in paths:
+        node = trie
+        parts = path.split(".")
+        for idx, part in enumerate(parts):
+            if part.isdigit():
+                part = int(part)
+            if idx == len(parts) - 1:
+                node[part] = True
+            else:
+                child = node.get(part)
+                if child is None:
+                    child = node[part] = {}
+                node = child
+    return trie
+
+class _Reader:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = b""
+        self._pos = 0
+        self.bytes_read = 0
+
+    def _fill(self):
+        for chunk in self._chunks:
+            if chunk:
+                self._buf = chunk
+                self._pos = 0
+                self.bytes_read += len(chunk)
+                return True
+        self._buf = b""
+        self._pos = 0
+        return False
+
+    def next(self):
+        if self._pos >= len(self._buf) and not self._fill():
+            raise ValueError("Unexpected end of JSON")
+        c = self._buf[self._pos]
+        self._pos += 1
+        return c
+
+    def peek(self):
+        if self._pos >= len(self._buf) and not self._fill():
+            return -1
+        return self._buf[self._pos]
+
+    def skip_ws(self):
+        c = self.next()
+        while c in _WS:
+            c = self.next()
+        return c
+
+class _Skipped:
+    pass
+
+_SKIPPED = _Skipped()
+
+def _read_hex4(reader):
+    return int(bytes((reader.next(), reader.next(), reader.next(), reader.next())).decode(), 16)
+
+def _read_string(reader):
+    out = bytearray()
+    while True:
+        c = reader.next()
+        if c == 34: # "
+            return out.decode("utf-8")
+        if c == 92: # backslash
+            c = reader.next()
+            if c == 117: # \uXXXX
+                code = _read_hex4(reader)
+                if 0xD800 <= code < 0xDC00: # surrogate pair
+                    reader.next(); reader.next()
+                    code = 0x10000 + ((code - 0xD800) << 10) + (_read_hex4(reader) - 0xDC00)
+                out.extend(chr(code).encode("utf-8"))
+            else:
+                out.extend(_ESCAPES.get(c, chr(c)).encode("utf-8"))
+        else:
+            out.append(c)
+
+def _skip_string(reader):
+    while True:
+        c = reader.next()
+        if c == 34:
+            return
+        if c == 92:
+            reader.next()
+
+def _read_scalar(reader, c):
+    if c == 116: # true
+        reader.next(); reader.next(); reader.next()
+        return True
+    if c == 102: # false
+        reader.next(); reader.next(); reader.next(); reader.next()
+        return False
+    if c == 110: # null
+        reader.next(); reader.next(); reader.next()
+        return None
+    num = bytearray((c,))
+    is_float = False
+    while True:
+        c = reader.peek()
+        if c < 0:
+            break
+        if c in b"0123456789-+":
+            num.append(reader.next())
+        elif c in b".eE":
+            is_float = True
+            num.append(reader.next())
+        else:
+            break
+    if is_float:
+        return float(num.decode())
+    return int(num.decode())
+
+def _value(reader, c, trie):
+    # trie is True to build the whole value, None to skip it or a dict of
+    # selected child keys/indices.
+    if c == 123: # {
+        return _object(reader, trie)
+    if c == 91: # [
+        return _array(reader, trie)
+    if c == 34:
+        if trie is None:
+            _skip_string(reader)
+            return _SKIPPED
+        return _read_string(reader)
+    value = _read_scalar(reader, c)
+    return _SKIPPED if trie is None else value
+
+def _object(reader, trie):
+    out = None if trie is None else {}
+    c = reader.skip_ws()
+    if c == 125: # }
+        return _SKIPPED if out is None else out
+    while True:
+        if c != 34:
+            raise ValueError("Expected object key")
+        if out is None:
+            _skip_string(reader)
+            child = None
+        else:
+            key = _read_string(reader)
+            child = True if trie is True else trie.get(key, trie.get("*"))
+        if reader.skip_ws() != 58: # :
+            raise ValueError("Expected ':'")
+        value = _value(reader, reader.skip_ws(), child)
+        if value is not _SKIPPED:
+            out[key] = value
+        c = reader.skip_ws()
+        if c == 125:
+            return _SKIPPED if out is None else out
+        if c != 44: # ,
+            raise ValueError("Expected ',' or '}'")
+        c = reader.skip_ws()
+
+def _array(reader, trie):
+    out = None if trie is None else []
+    pending = 0 # skipped slots before the next kept element, to keep indices stable
+    idx = 0
+    c = reader.skip_ws()
+    if c == 93: # ]
+        return _SKIPPED if out is None else out
+    while True:
+        if out is None:
+            child = None
+        elif trie is True:
+            child = True
+        else:
+            child = trie.get(idx, trie.get("*"))
+        value = _value(reader, c, child)
+        if value is _SKIPPED:
+            pending += 1
+        else:
+            while pending:
+                out.append(None)
+                pending -= 1
+            out.append(value)
+        idx += 1
+        c = reader.skip_ws()
+        if c == 93:
+            return _SKIPPED if out is None else out
+        if c != 44:
+            raise ValueError("Expected ',' or ']'")
+        c = reader.skip_ws()
+
+def extract(chunks, trie):
+    reader = _Reader(chunks)
+    value = _value(reader, reader.skip_ws(), trie)
+    return {} if value is _SKIPPED else value
+
+def extract_response(response, trie, chunk_size=256):
+    return extract(response.iter_content(chunk_size=chunk_size), trie)
@@ -0,0 +1,149 @@
+import json
+from array import array
+
+## Per-phase timing and memory instrumentation. Fetch, parse and render
+## steps are wrapped in phases:
+##     with metrics.phase("fetch", "forecast"):
+##         ...
+## Each phase records wall time (ms), bytes received from the network and
+## allocation delta. The last `size` samples of every phase are kept in
+## fixed arrays for rolling min/avg/max. The allocation delta is gc.mem_alloc() after minus before,
+## so a collection during the phase makes it negative.
+##
+## At the end of each cycle the largest free heap block is probed, once and
+## after the phase fields are taken so its test allocations don't show up in
+## them. One JSON line with the phases that ran and the largest block is
+## written to serial (or appended to a file), and a line of rolling
+## summaries every `size` cycles. When disabled phase() returns a shared no-op.
+
+FIELDS = ("ms", "bytes", "alloc")
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NULL_PHASE = _NullPhase()
+
+class Phase:
+    def __init__(self, metrics, name, size):
+        self._metrics = metrics
+        self.name = name
+        self.samples = [array("l", [0] * size) for x in FIELDS]
+        self.count = 0
+        self._start = None
+
+    def __enter__(self):
+        m = self._metrics
+        self._start = (m.hw.monotonic_ns(), m.received(), m.hw.mem_alloc())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        m = self._metrics
+        end = (m.hw.monotonic_ns(), m.received(), m.hw.mem_alloc())
+        self.add((end[0] - self._start[0]) // 1000000, end[1] - self._start[1], end[2] - self._start[2])
+        m.ran(self)
+        return False
+
+    def add(self, ms, received, alloc):
+        idx = self.count % len(self.samples[0])
+        for field, value in zip(self.samples, (ms, received, alloc)):
+            field[idx] = value
+        self.count += 1
+
+    def last(self):
+        idx = (self.count - 1) % len(self.samples[0])
+        return [x[idx] for x in self.samples]
+
+    def summary(self, field=0):
+        # [min, avg, max] over the samples in the ring
+        n = min(self.count, len(self.samples[0]))
+        if n == 0:
+            return [0, 0, 0]
+        values = self.samples[field][:n]
+        return [min(values), sum(values) // n, max(values)]
+
+class Metrics:
+    def __init__(self, hw, enabled=False, size=8, received=None, path=None):
+        self.hw = hw
+        self.enabled = enabled
+        self.size = size
+        self.path = path
+        self.received = received if received is not None else lambda: 0
+        self.cycle = 0
+        self.largest = array("l", [0] * size) # Largest free block per cycle
+        self._phases = {}
+        self._ran = []
+        self._cycle = None
+
+    def phase(self, kind, name=None):
+        if not self.enabled:
+            return NULL_PHASE
+        key = kind if name is None else kind + ":" + name
+        phase = self._phases.get(key)
+        if phase is None:
+            phase = Phase(self, key, self.size)
+            self._phases[key] = phase
+        return phase
+
+    def ran(self, phase):
+        if phase is not self._cycle and phase not in self._ran:
+            self._ran.append(phase)
+
+    def begin_cycle(self):
+        if not self.enabled:
+            return
+        self._ran = []
+        self._cycle = self.phase("cycle")
+        self._cycle.__enter__()
+
+    def end_cycle(self):
+        if not self.enabled or self._cycle is None:
+            return
+        self._cycle.__exit__(None, None, None)
+        self.cycle += 1
+        record = {"c": self.cycle, "t": self.hw.time(), "cycle": self._cycle.last()}
+        for x in self._ran:
+            record[x.name] = x.last()
+        largest = self.hw.largest_free_block()
+        self.largest[(self.cycle - 1) % self.size] = largest
+        record["largest"] = largest
+        self.write(record)
+        if self.cycle % self.size == 0:
+            self.write({"c": self.cycle, "summary": self.summary()})
+        self._cycle = None
+
+    def summary(self):
+        # {phase: {field: [min, avg, max]}}
+        result = {}
+        for name, phase in self._phases.items():
+            result[name] = dict((field, phase.summary(idx)) for idx, field in enumerate(FIELDS))
+        values = self.largest[:min(self.cycle, self.size)]
+        if len(values) > 0:
+            result["largest"] = [min(values), sum(values) // len(values), max(values)]
+        return result
+
+    def write(self, record):
+        line = json.dumps(record)
+        if self.path is None:
+            print(line)
+            return
+        try:
+            f = self.hw.open_file(self.path, "a")
+            try:
+                f.write(line + "\n")
+            finally:
+                f.close()
+        except OSError as e:
+            # CIRCUITPY is read-only unless boot.py remounts it
+            print("Metrics not written\n", e)
+            print(line)
+
+    def overlay(self):
+        if self._phases.get("cycle") is None:
+            return ""
+        cycle = self._phases["cycle"]
+        low, avg, high = cycle.summary()
+        return "c:" + str(cycle.last()[0]) + "/" + str(avg) + "/" + str(high) + "ms l:" + str(self.largest[(self.cycle - 1) % self.size])
@@ -0,0 +1,60 @@
+## Per-source refresh scheduling. Each source has its own interval; a source
+## that reports itself live is polled at live_interval, and one that keeps
+## coming back idle doubles its interval up to max_interval.
+
+class RefreshSource:
+    def __init__(self, name, interval, live_interval=None, max_interval=None):
+        self.name = name
+        self.interval = interval
+        self.live_interval = interval if live_interval is None else live_interval
+        self.max_interval = interval if max_interval is None else max_interval
+        self.current_interval = interval
+        self.next_due = 0
+        self.last_refresh = None
+        self.live = False
+        self.refresh_count = 0
+
+    def done(self, now, live=False):
+        if live:
+            self.current_interval = self.live_interval
+        elif self.live or self.last_refresh is None:
+            self.current_interval = self.interval
+        else:
+            self.current_interval = min(self.current_interval * 2, self.max_interval)
+        self.live = live
+        self.last_refresh = now
+        self.next_due = now + self.current_interval
+        self.refresh_count += 1
+
+    def retry(self, now, delay):
+        # Failed refresh: try again after delay without touching the interval
+        self.next_due = now + delay
+
+class RefreshScheduler:
+    def __init__(self):
+        self._sources = []
+
+    def add(self, name, interval, live_interval=None, max_interval=None):
+        source = RefreshSource(name, interval, live_interval, max_interval)
+        self._sources.append(source)
+        return source
+
+    def get(self, name):
+        for source in self._sources:
+            if source.name == name:
+                return source
+        raise KeyError(name)
+
+    def due(self, now, force=False):
+        return [x.name for x in self._sources if force or x.next_due <= now]
+
+    def done(self, name, now, live=False):
+        self.get(name).done(now, live)
+
+    def retry(self, name, now, delay):
+        self.get(name).retry(now, delay)
+
+    def seconds_until_due(self, now):
+        if len(self._sources) == 0:
+            return None
+        return max(0, min(x.next_due for x in self._sources) - now)
@@ -0,0 +1,47 @@
+## Source registry. Which sources run is decided by the config: a source
+## is enabled when all of its keys are set, and only enabled sources get a
+## schedule, health tracking and display slots. The module holding a
+## source's fetch and parse code is imported the first time it refreshes,
+## so a display without Twitch never loads glance_twitch. Every module is
+## a plain top-level module and can be shipped as .mpy (tools/build_mpy.py).
+
+## name: (module, config keys that must be set)
+SOURCES = {
+    "datetime": (None, ("aio_username", "aio_key", "timezone")),
+    "forecast": ("glance_weather", ("pirateweather_api_key", "pirateweather_api_forecast")),
+    "twitch": ("glance_twitch", ("twitch_api_key", "twitch_api_secret", "twitch_api_streamers")),
+}
+SPORTS_MODULE = "glance_sports"
+
+## ESPN leagues: (sport, league id or None for national teams). A
+## sports_api_<league> key in the config overrides the URL built from these.
+LEAGUES = {
+    "mlb": ("baseball", "mlb"),
+    "nfl": ("football", "nfl"),
+    "nhl": ("hockey", "nhl"),
+    "prem": ("soccer", "eng.1"),
+    "mls": ("soccer", "usa.1"),
+    "nwsl": ("soccer", "usa.nwsl"),
+    "usmnt": ("soccer", None),
+    "uswnt": ("soccer", None),
+}
+ESPN_URL = "https://site.web.api.espn.com/apis/v2/scoreboard/header?sport={sport}{league}&region=us&lang=en&contentorigin=espn&tz=America/New_York&team="
+ICON_ROOT = "/icons/sports/"
+
+def enabled(name, config):
+    for x in SOURCES[name][1]:
+        if len(config.get(x, "")) == 0:
+            return False
+    return True
+
+def league_url(name, config):
+    url = config.get("sports_api_" + name, "")
+    if len(url) > 0:
+        return url
+    if name not in LEAGUES:
+        raise ValueError("No sports_api_" + name + " URL for unknown league " + name)
+    sport, league = LEAGUES[name]
+    return ESPN_URL.format(sport=sport, league="" if league is None else "&league=" + league)
+
+def league_teams(name, config):
+    return [x for x in config.get("sports_api_" + name + "_teams", "").split(",") if len(x) > 0]
@@ -0,0 +1,59 @@
+import glance_json
+
+## ESPN live game lookups, loaded by pyglanceportal.py the first time a
+## league refreshes. Live teams are marked in league.scratch (glance_state.py)
+## and the caller commits them.
+
+TEAM_PATHS = glance_json.compile_paths(("sports.0.leagues.0.events.0.status", "sports.0.leagues.0.events.0.shortName"))
+SCOREBOARD_PATHS = glance_json.compile_paths(("sports.0.leagues.0.events.*.status", "sports.0.leagues.0.events.*.shortName", "sports.0.leagues.0.events.*.competitors.*.abbreviation"))
+
+def fetch_league(requests, metrics, league, batch=True, debug=False):
+    league.clear_scratch()
+    if len(league.teams) == 0:
+        print("No teams for " + league.name + ". Skipping.")
+        return league
+    if batch and league.batch:
+        return fetch_scoreboard(requests, metrics, league, debug)
+    for idx in range(len(league.teams)):
+        if debug:
+            print(idx, " ", league.name, " ", league.teams[idx])
+        if fetch_team(requests, metrics, league, idx, debug):
+            league.scratch[idx] = 1
+        elif debug:
+            print("No game for " + league.keys[idx])
+    return league
+
+def fetch_team(requests, metrics, league, idx, debug=False):
+    with requests.get(league.team_urls[idx]) as r:
+        with metrics.phase("parse", league.name):
+            return parse_team(glance_json.extract_response(r, TEAM_PATHS), debug)
+
+def fetch_scoreboard(requests, metrics, league, debug=False):
+    with requests.get(league.scoreboard_url) as r:
+        with metrics.phase("parse", league.name):
+            return parse_scoreboard(league, glance_json.extract_response(r, SCOREBOARD_PATHS), debug)
+
+def parse_team(team_json, debug=False):
+    event = team_json["sports"][0]["leagues"][0]["events"][0]
+    if event["status"] == "in":
+        if debug:
+            print("game:" + event["shortName"] + " status:" + event["status"])
+        return True
+    return False
+
+def parse_scoreboard(league, scoreboard_json, debug=False):
+    scoreboard = scoreboard_json["sports"][0]["leagues"][0]
+    if "events" in scoreboard:
+        for event in scoreboard["events"]:
+            if event["status"] == "in":
+                for x in event["competitors"]:
+                    idx = league.abbreviations.get(x["abbreviation"])
+                    if idx is not None:
+                        league.scratch[idx] = 1
+                        if debug:
+                            print("game:" + event["shortName"] + " status:in")
+    if debug:
+        for idx in range(len(league.teams)):
+            if not league.scratch[idx]:
+                print("No game for " + league.keys[idx])
+    return league
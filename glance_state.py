@@ -0,0 +1,88 @@
+from array import array
+
+## Fixed-capacity state for what is on screen. Everything is sized once at
+## startup from the config. A refresh fills a spare buffer and the portal
+## swaps it in only after a clean parse, so steady-state refreshes allocate
+## nothing here and a failed parse leaves the old values on screen.
+
+class Forecast:
+    __slots__ = ("icons", "low", "high", "count")
+
+    def __init__(self, days):
+        self.icons = [None] * days
+        self.low = array("h", [0] * days)
+        self.high = array("h", [0] * days)
+        self.count = 0
+
+    def set(self, idx, icon, low, high):
+        self.icons[idx] = icon
+        self.low[idx] = low
+        self.high[idx] = high
+
+    def same(self, other):
+        if self.count != other.count:
+            return False
+        for idx in range(self.count):
+            if self.icons[idx] != other.icons[idx] or self.low[idx] != other.low[idx] or self.high[idx] != other.high[idx]:
+                return False
+        return True
+
+class Streamers:
+    __slots__ = ("names", "count")
+
+    def __init__(self, capacity):
+        self.names = [None] * capacity
+        self.count = 0
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, name):
+        if self.count < len(self.names):
+            self.names[self.count] = name
+            self.count += 1
+
+    def same(self, other):
+        if self.count != other.count:
+            return False
+        for idx in range(self.count):
+            if self.names[idx] != other.names[idx]:
+                return False
+        return True
+
+class League:
+    ## Team abbreviations, icon paths and URLs are built once. Live flags are
+    ## one byte per configured team; parses fill `scratch` and commit() swaps
+    ## it with `live`.
+    __slots__ = ("name", "teams", "abbreviations", "keys", "icons", "team_urls", "scoreboard_url", "batch", "live", "scratch")
+
+    def __init__(self, name, teams, url, icon_root="/icons/sports/"):
+        self.name = name
+        self.teams = tuple(teams)
+        # ESPN abbreviations are upper case, config handles usually aren't
+        self.abbreviations = dict((x.upper(), idx) for idx, x in enumerate(self.teams))
+        self.keys = tuple(name + "/" + x for x in self.teams)
+        self.icons = tuple(icon_root + x + ".bmp" for x in self.keys)
+        self.team_urls = tuple(url + x for x in self.teams)
+        self.scoreboard_url = url[:-len("&team=")] if url.endswith("&team=") else url
+        # A league scoreboard covers every team in one request; URLs without
+        # a league (e.g. national teams) can only be queried per team.
+        self.batch = "league=" in url
+        self.live = bytearray(len(self.teams))
+        self.scratch = bytearray(len(self.teams))
+
+    def clear_scratch(self):
+        for idx in range(len(self.scratch)):
+            self.scratch[idx] = 0
+
+    def commit(self):
+        # Returns True when the live teams changed
+        changed = self.scratch != self.live
+        self.live, self.scratch = self.scratch, self.live
+        return changed
+
+    def live_count(self):
+        count = 0
+        for x in self.live:
+            count += x
+        return count
@@ -0,0 +1,40 @@
+## Small records kept across reboots in a fixed region of non-volatile memory
+## (microcontroller.nvm on the PyPortal). Each record is a 2 byte magic, a 2
+## byte length and the payload. Writes are skipped when the payload is
+## unchanged since NVM is backed by flash.
+
+MAGIC = b"GP"
+
+class NVMStore:
+    def __init__(self, nvm, offset, size):
+        self._nvm = nvm
+        self.offset = offset
+        self.size = size
+        self.writes = 0
+
+    def load(self):
+        if self._nvm is None:
+            return None
+        header = bytes(self._nvm[self.offset:self.offset+4])
+        if header[:2] != MAGIC:
+            return None
+        length = header[2] | (header[3] << 8)
+        if length > self.size - 4:
+            return None
+        return bytes(self._nvm[self.offset+4:self.offset+4+length])
+
+    def save(self, data):
+        if self._nvm is None:
+            return False
+        if len(data) > self.size - 4:
+            raise ValueError("Record too large for NVM region")
+        if self.load() == data:
+            return False
+        record = MAGIC + bytes((len(data) & 0xFF, len(data) >> 8)) + data
+        self._nvm[self.offset:self.offset+len(record)] = record
+        self.writes += 1
+        return True
+
+    def clear(self):
+        if self._nvm is not None:
+            self._nvm[self.offset:self.offset+2] = b"\x00\x00"
@@ -0,0 +1,78 @@
+## Twitch live streamers, loaded by pyglanceportal.py the first time Twitch
+## refreshes. The app access token is kept in NVM with its expiry, so a
+## valid token is reused across reboots without a round-trip to the
+## validate endpoint. A token that Helix rejects is replaced.
+
+TOKEN_MARGIN = 864000 # Refresh token if less than 10 days until expiry
+
+class TwitchClient:
+    def __init__(self, hw, requests, metrics, store, client_id, token_url, streams_url, debug=False):
+        self._hw = hw
+        self._requests = requests
+        self._metrics = metrics
+        self._store = store
+        self._client_id = client_id
+        self._token_url = token_url
+        self._streams_url = streams_url
+        self._debug = debug
+        self.token = ""
+        self.expires = 0
+        self._headers = None
+        self.load_token()
+
+    def set_token(self, token, expires):
+        self.token = token
+        self.expires = expires
+        self._headers = {"Client-ID": self._client_id, "Authorization": "Bearer " + token}
+
+    def load_token(self):
+        record = self._store.load()
+        if record is None:
+            return
+        try:
+            expires, token = str(record, "utf-8").split("\n")
+            self.set_token(token, int(expires))
+            if self._debug:
+                print("Loaded Twitch bearer token, expires in " + str(self.expires - int(self._hw.time())))
+        except (ValueError, UnicodeError) as e:
+            print("Ignoring stored Twitch bearer token\n", e)
+
+    def save_token(self):
+        record = str(self.expires) + "\n" + self.token
+        self._store.save(record.encode("utf-8"))
+
+    def fetch_token(self, force=False):
+        expires = self.expires - int(self._hw.time())
+        if force or self.token == "" or expires < TOKEN_MARGIN:
+            print("Fetching new Twitch bearer token")
+            with self._requests.post(self._token_url) as r:
+                t = r.json()
+            self.set_token(t["access_token"], int(self._hw.time()) + t["expires_in"])
+            print("Twitch bearer token expires in " + str(t["expires_in"]))
+            self.save_token()
+        return self.token
+
+    def fetch_streams(self, streamers):
+        self.fetch_token()
+        with self._requests.get(self._streams_url, headers=self._headers) as r:
+            if r.status_code == 200:
+                with self._metrics.phase("parse", "twitch"):
+                    return parse_streams(r.json(), streamers)
+            if r.status_code != 401:
+                # Rate limited or a server error, keep the streamers shown
+                raise ValueError("Twitch streams returned " + str(r.status_code))
+        print("Twitch bearer token rejected, fetching a new one")
+        self.fetch_token(force=True)
+        with self._requests.get(self._streams_url, headers=self._headers) as r:
+            if r.status_code != 200:
+                raise ValueError("Twitch streams returned " + str(r.status_code))
+            with self._metrics.phase("parse", "twitch"):
+                return parse_streams(r.json(), streamers)
+
+def parse_streams(streams_json, streamers):
+    streamers.clear()
+    if "data" in streams_json:
+        for x in streams_json["data"]:
+            if x["type"] == "live":
+                streamers.add(x["user_name"])
+    return streamers
@@ -0,0 +1,20 @@
+import glance_json
+
+## Pirate Weather forecast, loaded by pyglanceportal.py the first time the
+## forecast refreshes.
+
+PATHS = glance_json.compile_paths(("daily.data.*.icon", "daily.data.*.temperatureLow", "daily.data.*.temperatureHigh"))
+
+def fetch_forecast(requests, metrics, url, forecast):
+    with requests.get(url) as r:
+        with metrics.phase("parse", "forecast"):
+            return parse_forecast(glance_json.extract_response(r, PATHS), forecast)
+
+def parse_forecast(forecast_json, forecast):
+    days = forecast_json["daily"]["data"]
+    forecast.count = 0
+    for x in range(min(len(days), len(forecast.icons))):
+        day = days[x]
+        forecast.set(x, day["icon"], int(round(day["temperatureLow"])), int(round(day["temperatureHigh"])))
+        forecast.count += 1
+    return forecast
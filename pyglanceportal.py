@@ -1,16 +1,14 @@
 import time
 import gc
-import board
-import displayio
-import digitalio
-import terminalio
-import busio
-import neopixel
-import adafruit_requests as requests
-from adafruit_esp32spi import adafruit_esp32spi_socket as socket
-from adafruit_esp32spi import adafruit_esp32spi
-from adafruit_esp32spi import adafruit_esp32spi_wifimanager
-from adafruit_display_text import label
+import glance_sources
+from glance_icons import IconCache, FILE_COST
+from glance_scheduler import RefreshScheduler
+from glance_store import NVMStore
+from glance_clock import ClockService
+from glance_http import ManagedSession
+from glance_health import HealthTracker, CLOSED
+from glance_metrics import Metrics
+from glance_state import Forecast, Streamers, League
 
 try:
     from secrets import secrets
@@ -18,39 +16,81 @@ except ImportError:
     print("Wifi and API secrets are kept in secrets.py, please add them there!")
     raise
 
+TWITCH_TOKEN_NVM = (0, 256) # NVM offset and size of the persisted token
+SNAPSHOT_NVM = (256, 1024) # NVM offset and size of the warm-start snapshot
+SNAPSHOT_VERSION = "1"
+SNAPSHOT_MAX_AGE = 3600 # Rewrite an unchanged snapshot at most this often to spare flash
+AGGREGATOR_VERSION = "1"
+FORECAST_DAYS = 6
+DAYS = ("Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat")
+
+DISPLAY_GROUPS = ("weather_group", "days_group", "temp_group", "stream_group", "sports_group", "updated_group")
+DEBUG_GROUPS = ("memory_group", "error_group", "metrics_group")
+
 class PyGlancePortal:
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, hardware=None, config=None):
+        boot_start = time.monotonic()
+        if config is None:
+            config = secrets
         self._settings = {
-            "ssid": secrets["ssid"],
-            "password": secrets["password"],
-            "timezone": secrets["timezone"],
-            "aio_username": secrets["aio_username"],
-            "aio_key": secrets["aio_key"],
-            "pirateweather_api_key": secrets["pirateweather_api_key"],
-            "pirateweather_api_forecast": secrets["pirateweather_api_forecast"],
-            "twitch_api_key": secrets["twitch_api_key"],
-            "twitch_api_secret": secrets["twitch_api_secret"],
-            "twitch_api_streamers": secrets["twitch_api_streamers"],
-            "sports_leagues": secrets["sports_leagues"],
-            "sports_api_nhl": secrets["sports_api_nhl"],
-            "sports_api_nhl_teams": secrets["sports_api_nhl_teams"],
-            "sports_api_nfl": secrets["sports_api_nfl"],
-            "sports_api_nfl_teams": secrets["sports_api_nfl_teams"],
-            "sports_api_mlb": secrets["sports_api_mlb"],
-            "sports_api_mlb_teams": secrets["sports_api_mlb_teams"],
-            "sports_api_prem": secrets["sports_api_prem"],
-            "sports_api_prem_teams": secrets["sports_api_prem_teams"],
-            "sports_api_mls": secrets["sports_api_mls"],
-            "sports_api_mls_teams": secrets["sports_api_mls_teams"],
-            "sports_api_nwsl": secrets["sports_api_nwsl"],
-            "sports_api_nwsl_teams": secrets["sports_api_nwsl_teams"],
-            "sports_api_usmnt": secrets["sports_api_usmnt"],
-            "sports_api_usmnt_teams": secrets["sports_api_usmnt_teams"],
-            "sports_api_uswnt": secrets["sports_api_uswnt"],
-            "sports_api_uswnt_teams": secrets["sports_api_uswnt_teams"],
+            "ssid": config["ssid"],
+            "password": config["password"],
+            "refresh_datetime": config.get("refresh_datetime", 14400),
+            "refresh_forecast": config.get("refresh_forecast", 3600),
+            "refresh_twitch": config.get("refresh_twitch", 300),
+            "refresh_twitch_live": config.get("refresh_twitch_live", 120),
+            "refresh_sports": config.get("refresh_sports", 300),
+            "refresh_sports_live": config.get("refresh_sports_live", 60),
+            "refresh_sports_idle_max": config.get("refresh_sports_idle_max", 1800),
+            "refresh_aggregator": config.get("refresh_aggregator", 60),
+            "sports_batch": config.get("sports_batch", True),
+            "http_max_sockets": config.get("http_max_sockets", 4),
+            "health_backoff": config.get("health_backoff", 30),
+            "health_backoff_max": config.get("health_backoff_max", 300),
+            "health_open_after": config.get("health_open_after", 3),
+            "health_open_timeout": config.get("health_open_timeout", 600),
+            "health_open_timeout_max": config.get("health_open_timeout_max", 3600),
+            "metrics": config.get("metrics", False),
+            "metrics_size": config.get("metrics_size", 8),
+            "metrics_file": config.get("metrics_file", None),
+            "icon_cache_budget": config.get("icon_cache_budget", 16*FILE_COST),
+            "icon_atlas": config.get("icon_atlas", True),
             "default_weather_icon": "/icons/weather/unknown.bmp",
             "default_twitch_icon": "/icons/streamers/twitch.bmp"
         }
+        # A league without teams has nothing to fetch or show
+        self._leagues = [x for x in config.get("sports_leagues", "").split(",") if len(x) > 0 and len(glance_sources.league_teams(x, config)) > 0]
+        self._streamer_names = tuple(x for x in config.get("twitch_api_streamers", "").split(",") if len(x) > 0)
+
+        ## Requests
+        # URLs, headers and per-team paths are built once here rather than on
+        # every refresh, so the API secrets only live on in them. With an
+        # aggregator (glance_aggregator.py) every section comes from one
+        # request to it and no upstream API keys are needed.
+        # Only sources whose keys are set in the config are enabled, see
+        # glance_sources.py
+        self._aggregator_url = config.get("aggregator_url", None)
+        self._aggregator_headers = {}
+        self._modules = {}
+        self._twitch = None
+        if self._aggregator_url is not None:
+            self._sources = ["aggregator"]
+        else:
+            self._sources = [x for x in glance_sources.SOURCES if glance_sources.enabled(x, config)] + self._leagues
+        if "datetime" in self._sources:
+            self._aio_url = "https://io.adafruit.com/api/v2/" + config["aio_username"] + "/integrations/time/struct.json?tz=" + config["timezone"]
+            self._aio_headers = {"X-AIO-KEY": config["aio_key"]}
+        if "forecast" in self._sources:
+            self._forecast_url = config["pirateweather_api_forecast"].format(pirateweather_api_key=config["pirateweather_api_key"])
+        if "twitch" in self._sources:
+            self._twitch_client_id = config["twitch_api_key"]
+            self._twitch_token_url = "https://id.twitch.tv/oauth2/token?client_id={client_id}&client_secret={client_secret}&grant_type=client_credentials".format(
+                client_id=config["twitch_api_key"], client_secret=config["twitch_api_secret"])
+            self._twitch_url = "https://api.twitch.tv/helix/streams?" + "&".join(["user_login=" + x for x in self._streamer_names])
+        self._sports = {}
+        for x in self._leagues:
+            url = glance_sources.league_url(x, config) if self._aggregator_url is None else ""
+            self._sports[x] = League(x, glance_sources.league_teams(x, config), url, glance_sources.ICON_ROOT)
 
         self._debug = debug
         self._debug_refresh_counter = 0
@@ -59,37 +99,91 @@ class PyGlancePortal:
         self._debug_reset_counter = 0
         self._debug_total_reset_counter = 0
         self._debug_wifi_retry_counter = 0
+        self._debug_alloc_counter = 0
+        self._debug_total_alloc_counter = 0
 
         self._today = 0
         self._updated = ""
-        self._twitch_bearer_token = ""
+        self._updated_minute = None
+        # Refreshes parse into the spare buffer and swap on success
+        self._forecast = Forecast(FORECAST_DAYS)
+        self._forecast_next = Forecast(FORECAST_DAYS)
+        self._streamers = Streamers(len(self._streamer_names))
+        self._streamers_next = Streamers(len(self._streamer_names))
+        self._weather_icons = {}
+        self._streamer_icons = {}
+        self._stale = set()
+        self._snapshot_body = None
+        self._snapshot_saved_at = None
+        self._snapshot_dirty = True
+        self.first_pixel_time = None
+        self.first_live_time = None
         self._display_groups = {}
-        self.reset_display_groups()
-
-        # PyPortal Board Setup
-        board.DISPLAY.brightness = 1
-        self._status_light = neopixel.NeoPixel(board.NEOPIXEL, 1, brightness=0.2)
-        self._led = digitalio.DigitalInOut(board.D13)
-        self._led.direction = digitalio.Direction.OUTPUT
-
-        # PyPortal ESP32 Setup
-        self._esp32_cs = digitalio.DigitalInOut(board.ESP_CS)
-        self._esp32_ready = digitalio.DigitalInOut(board.ESP_BUSY)
-        self._esp32_reset = digitalio.DigitalInOut(board.ESP_RESET)
-        self._spi = busio.SPI(board.SCK, board.MOSI, board.MISO)
+        self._icon_keys = {}
+        self._root_group = None
+        self._source = None
+        self._reconnect_at = None
+
+        ## Refresh Schedule
+        self._scheduler = RefreshScheduler()
+        if self._aggregator_url is not None:
+            self._scheduler.add("aggregator", self._settings["refresh_aggregator"])
+        else:
+            if "datetime" in self._sources:
+                self._scheduler.add("datetime", self._settings["refresh_datetime"])
+            if "forecast" in self._sources:
+                self._scheduler.add("forecast", self._settings["refresh_forecast"])
+            if "twitch" in self._sources:
+                self._scheduler.add("twitch", self._settings["refresh_twitch"], self._settings["refresh_twitch_live"])
+            for x in self._leagues:
+                self._scheduler.add(x, self._settings["refresh_sports"], self._settings["refresh_sports_live"], self._settings["refresh_sports_idle_max"])
+
+        ## Source Health
+        self._health = HealthTracker(backoff=self._settings["health_backoff"], backoff_max=self._settings["health_backoff_max"],
+                                     open_after=self._settings["health_open_after"], open_timeout=self._settings["health_open_timeout"],
+                                     open_timeout_max=self._settings["health_open_timeout_max"])
+        for x in self._sources:
+            self._health.add(x)
+        # The ESP reset ladder: first retries come quickly, after 20 resets
+        # in a row the WiFi is only probed every open_timeout seconds
+        self._health.add("network", backoff=15, open_after=20)
+
+        # Hardware Setup
+        if hardware is None:
+            from glance_hardware import PyPortalHardware
+            hardware = PyPortalHardware()
+        self._hw = hardware
+        self._boot_time = self._hw.monotonic()
+        self._hw.display.brightness = 1
+        self._status_light = self._hw.status_light
+        self._led = self._hw.led
         self._esp = None
+        self._clock = ClockService(self._hw)
+        self._icons = IconCache(self._hw, self._settings["icon_cache_budget"], self._settings["icon_atlas"])
+        self._twitch_token_store = NVMStore(getattr(self._hw, "nvm", None), TWITCH_TOKEN_NVM[0], TWITCH_TOKEN_NVM[1])
+        self._snapshot_store = NVMStore(getattr(self._hw, "nvm", None), SNAPSHOT_NVM[0], SNAPSHOT_NVM[1])
 
         self._wifi_client = None
         self._socket = None
-        self._requests = None
+        self._requests = ManagedSession(self._hw, self._settings["http_max_sockets"])
+        self._metrics = Metrics(self._hw, self._settings["metrics"], self._settings["metrics_size"],
+                                lambda: self._requests.bytes_received, self._settings["metrics_file"])
 
-        self.connect_wifi()
+        self.reset_display_groups()
+        gc.collect()
+        self.setup_time = time.monotonic() - boot_start
+        self.setup_free = self._hw.mem_free()
+        print("Setup took %.2fs, %d bytes free, sources: %s" % (self.setup_time, self.setup_free, ",".join(self._sources)))
+        # Show the last known good data before waiting on WiFi and the APIs
+        self.show_snapshot()
+        with self._metrics.phase("connect"):
+            self.connect_wifi()
 
     def connect_wifi(self):
         # ESP32 Setup
-        self._esp = adafruit_esp32spi.ESP_SPIcontrol(self._spi, self._esp32_cs, self._esp32_ready, self._esp32_reset)
+        self._esp = self._hw.esp32()
 
-        if self._esp.status == adafruit_esp32spi.WL_IDLE_STATUS:
+        if self._esp.status == self._hw.idle_status:
             print("ESP32 found and in idle mode")
         print("Firmware vers.", self._esp.firmware_version)
         print("MAC addr:", [hex(i) for i in self._esp.MAC_address])
@@ -109,277 +203,657 @@ class PyGlancePortal:
                 self._esp.connect_AP(self._settings["ssid"], self._settings["password"])
             except (RuntimeError, ConnectionError) as e:
                 # Defensive exception handling for ConnectionError: Failed to request hostname
-                if self._debug_wifi_retry_counter > 1:
-                    board.DISPLAY.root_group = displayio.CIRCUITPYTHON_TERMINAL
+                if self._debug_wifi_retry_counter > 1 and len(self._stale) == 0:
+                    self.show_terminal()
                 print("Could not connect to WiFi, retrying:\n", e)
-                time.sleep(5)
+                self.block("wifi", 5)
                 continue
 
         print("Connected to:", str(self._esp.ssid, "utf-8"), "  RSSI:", self._esp.rssi)
         print("IP address:", self._esp.pretty_ip(self._esp.ip_address))
 
-        requests.set_socket(socket, self._esp)
-
-    def get_dayname(self, wday_num):
-        days = ["Sun","Mon","Tue","Wed","Thu","Fri","Sat"]
-        return(days[wday_num%7])
+        pool, ssl_context = self._hw.socket_pool(self._esp)
+        self._requests.attach(pool, ssl_context)
+
+    def block(self, reason, seconds):
+        # Every sleep inside the loop goes through here so blocked time is visible
+        self._hw.sleep(seconds)
+        self._health.add_blocked(reason, seconds)
+
+    def reconnect_wifi(self):
+        self._reconnect_at = None
+        gc.collect()
+        with self._metrics.phase("connect"):
+            self.connect_wifi()
+
+    def get_dayname(self, wday_num=None):
+        if wday_num is None:
+            wday_num = self._today
+        return(DAYS[wday_num%7])
+
+    def icon_path(self, cache, root, name):
+        # Icon paths are built once per name instead of on every render
+        path = cache.get(name)
+        if path is None:
+            path = root + name + ".bmp"
+            cache[name] = path
+        return path
 
     def fetch_datetime(self):
-        url = "https://io.adafruit.com/api/v2/{aio_username}/integrations/time/struct.json?tz=" + self._settings["timezone"]
-        r = requests.get(url.format(aio_username=self._settings["aio_username"]), headers={"X-AIO-KEY":self._settings["aio_key"]})
-        t = r.json()
+        with self._requests.get(self._aio_url, headers=self._aio_headers) as r:
+            with self._metrics.phase("parse", "datetime"):
+                t = r.json()
         return time.struct_time((t["year"], t["mon"], t["mday"], t["hour"], t["min"], t["sec"], t["wday"], t["yday"], t["isdst"]))
 
-    def fetch_forecast(self):
-        url = self._settings["pirateweather_api_forecast"]
-        r = requests.get(url.format(pirateweather_api_key=self._settings["pirateweather_api_key"]))
-        return self.parse_forecast(r.json())
-
-    def fetch_twitch_bearer_token(self):
-        expires = 0
-        if self._twitch_bearer_token != "":
-            exp = requests.get("https://id.twitch.tv/oauth2/validate", headers={"Authorization":"OAuth "+self._twitch_bearer_token})
-            expires = exp.json()["expires_in"]
-            print("Twitch bearer token expires in " + str(expires))
-        if self._twitch_bearer_token == "" or expires < 864000: # Refresh token if less than 1 week until expiry
-            print("Fetching new Twitch bearer token")
-            url = "https://id.twitch.tv/oauth2/token?client_id={client_id}&client_secret={client_secret}&grant_type=client_credentials"
-            r = requests.post(url.format(client_id=self._settings["twitch_api_key"], client_secret=self._settings["twitch_api_secret"]))
-            self._twitch_bearer_token = r.json()["access_token"]
-        return self._twitch_bearer_token
-
-    def fetch_twitch_streams(self):
-        streamers = self._settings["twitch_api_streamers"].split(",")
-        qsparam = "user_login="
-        for idx,x in enumerate(streamers):
-            streamers[idx] = qsparam + streamers[idx]
-        t = self.fetch_twitch_bearer_token()
-        r = requests.get("https://api.twitch.tv/helix/streams?" + "&".join(streamers), headers={"Client-ID":self._settings["twitch_api_key"],"Authorization":"Bearer "+t})
-        return self.parse_twitch_streams(r.json())
-
-    def fetch_league(self, league, teams, league_url, group, numlive):
-        if len(teams) == 0:
-            print("No teams for " + league + ". Skipping.")
-            return numlive
-        for idx,x in enumerate(teams.split(",")):
-            if self._debug:
-                print(idx, " ", league, " ", x)
-            team_data = self.fetch_team(league_url, league, x)
-            if len(team_data) > 0:
-                team_icon = "/icons/sports/"+ team_data + ".bmp"
-                if self._debug:
-                    print(team_icon)
-                try:
-                    team_file = open(team_icon, "rb")
-                except OSError as e:
-                    team_file = open(self._settings["default_weather_icon"], "rb")
-                img = displayio.OnDiskBitmap(team_file)
-                img_sprite = displayio.TileGrid(img, pixel_shader=displayio.ColorConverter(), x=320-(34*(numlive+1)), y=2)
-                group.append(img_sprite)
-                numlive = numlive + 1
-            elif self._debug:
-                print("No game for " + league + " " + x)
-        return numlive
-
-    def fetch_team(self, api_url, league, team):
-        r = requests.get(api_url+team)
-        return self.parse_team(league, team, r.json())
-
-    def parse_forecast(self, forecast_json):
-        forecast_days = list()
-        for x in range(0,6):
-            day = forecast_json["daily"]["data"][x]
-            forecast_days.append((day["icon"], int(round(day["temperatureLow"])), int(round(day["temperatureHigh"]))))
-        return forecast_days
-
-    def parse_twitch_streams(self, streams_json):
-        streamers = list()
-        if "data" in streams_json:
-            for x in streams_json["data"]:
-                if x["type"] == "live":
-                    streamers.append(x["user_name"])
-        return streamers
-
-    def parse_team(self, league, team, team_json):
-        t = ""
-        if team_json["sports"][0]["leagues"][0]["events"][0]["status"] == "in":
-            t = league + "/" + team
+    def source_module(self, name):
+        # Source code is imported on first use, see glance_sources.py
+        module = self._modules.get(name)
+        if module is None:
+            module = __import__(name)
+            self._modules[name] = module
             if self._debug:
-                print("game:" + team_json["sports"][0]["leagues"][0]["events"][0]["shortName"] + " status:" + team_json["sports"][0]["leagues"][0]["events"][0]["status"])
-        return t
+                print("Loaded " + name + ", free " + str(self._hw.mem_free()))
+        return module
+
+    def fetch_forecast(self, forecast):
+        weather = self.source_module(glance_sources.SOURCES["forecast"][0])
+        return weather.fetch_forecast(self._requests, self._metrics, self._forecast_url, forecast)
+
+    def fetch_twitch_streams(self, streamers):
+        if self._twitch is None:
+            twitch = self.source_module(glance_sources.SOURCES["twitch"][0])
+            self._twitch = twitch.TwitchClient(self._hw, self._requests, self._metrics, self._twitch_token_store, self._twitch_client_id,
+                                               self._twitch_token_url, self._twitch_url, self._debug)
+        return self._twitch.fetch_streams(streamers)
+
+    def fetch_aggregate(self):
+        # True when the aggregator sent new data, False on 304 Not Modified
+        with self._requests.get(self._aggregator_url, headers=self._aggregator_headers) as r:
+            clock = r.headers.get("x-glance-time")
+            if clock is not None and (self._clock.needs_sync() or self._clock.seconds_since_sync() >= self._settings["refresh_datetime"]):
+                datetime = self.decode_time(clock)
+                self._clock.sync(datetime)
+                self._hw.set_time(datetime)
+            if r.status_code == 304:
+                return False
+            # 503 until the aggregator has every section, keep what is shown
+            if r.status_code != 200:
+                raise ValueError("Aggregator returned " + str(r.status_code))
+            with self._metrics.phase("parse", "aggregator"):
+                self.decode_aggregate(r.content)
+            etag = r.headers.get("etag")
+        if etag is not None:
+            self._aggregator_headers["If-None-Match"] = etag
+        return True
+
+    def fetch_league(self, league):
+        sports = self.source_module(glance_sources.SPORTS_MODULE)
+        return sports.fetch_league(self._requests, self._metrics, league, self._settings["sports_batch"], self._debug)
 
     def reset_display_groups(self):
+        for keys in self._icon_keys.values():
+            for x in keys:
+                if x is not None:
+                    self._icons.release(x[1])
+
         self._display_groups = {
-            "weather_group": displayio.Group(),
-            "days_group": displayio.Group(),
-            "temp_group": displayio.Group(),
-            "stream_group": displayio.Group(),
-            "sports_group": displayio.Group(),
-            "updated_group":  displayio.Group(),
-            "memory_group": displayio.Group(),
-            "error_group": displayio.Group()
+            "weather_group": self._hw.Group(),
+            "days_group": self._hw.Group(),
+            "temp_group": self._hw.Group(),
+            "stream_group": self._hw.Group(),
+            "sports_group": self._hw.Group(),
+            "updated_group":  self._hw.Group(),
+            "memory_group": self._hw.Group(),
+            "error_group": self._hw.Group(),
+            "metrics_group": self._hw.Group()
+        }
+
+        self._icon_keys = {
+            "weather_group": [],
+            "stream_group": [],
+            "sports_group": []
         }
 
+        ## Build Layout
+        # Every label and icon slot is created once here; refreshes only
+        # change text, swap sprites and toggle visibility.
+        for idx in range(6):
+            self.add_icon_slot("weather_group", 16+(idx*50), 100)
+            self.add_label("temp_group", 22+(idx*50), 150)
+            self.add_label("days_group", 22+(idx*50), 90)
+
+        for idx in range(len(self._streamer_names)):
+            self.add_icon_slot("stream_group", idx*34, 2)
+
+        team_slots = 0
+        for x in self._leagues:
+            team_slots += len(self._sports[x].teams)
+        for idx in range(team_slots):
+            self.add_icon_slot("sports_group", 320-(34*(idx+1)), 2)
+
+        self.add_label("updated_group", 275, 230)
+        self.add_label("memory_group", 10, 230)
+        self.add_label("error_group", 115, 230)
+        self.add_label("metrics_group", 10, 218)
+
+        self._root_group = self._hw.Group()
+        for x in DISPLAY_GROUPS:
+            self._root_group.append(self._display_groups[x])
+        if self._debug:
+            for x in DEBUG_GROUPS:
+                self._root_group.append(self._display_groups[x])
+
+    def add_icon_slot(self, name, x, y):
+        slot = self._hw.Group(x=x, y=y)
+        slot.hidden = True
+        self._display_groups[name].append(slot)
+        self._icon_keys[name].append(None)
+
+    def add_label(self, name, x, y):
+        area = self._hw.label("")
+        area.x = x
+        area.y = y
+        self._display_groups[name].append(area)
+
+    def set_icon(self, name, idx, path, default_path):
+        slot = self._display_groups[name][idx]
+        current = self._icon_keys[name][idx]
+        if current is None or current[0] != path:
+            file_path, img, tile = self._icons.acquire(path, default_path)
+            if current is not None and current[1] == file_path and tile is not None:
+                # Same sprite sheet, just point the tile at the new icon
+                slot[0][0] = tile
+            else:
+                img_sprite = self._icons.sprite(img, tile)
+                self._debug_alloc_counter += 1
+                if len(slot) > 0:
+                    slot.pop()
+                slot.append(img_sprite)
+            if current is not None:
+                self._icons.release(current[1])
+            self._icon_keys[name][idx] = (path, file_path)
+        slot.hidden = False
+
+    def hide_icons(self, name, start):
+        group = self._display_groups[name]
+        for idx in range(start, len(group)):
+            group[idx].hidden = True
+
+    def set_text(self, name, idx, text):
+        area = self._display_groups[name][idx]
+        if area.text != text:
+            area.text = text
+            self._debug_alloc_counter += 1
+
+    def encode_snapshot(self, updated):
+        return "\n".join((SNAPSHOT_VERSION, updated, str(self._today), self.encode_state()))
+
+    def encode_state(self):
+        # Forecast, live streamers and live teams, one line each. Shared by
+        # the snapshot and the aggregator payload.
+        teams = list()
+        for x in self._leagues:
+            league = self._sports[x]
+            for idx in range(len(league.teams)):
+                if league.live[idx]:
+                    teams.append(league.keys[idx])
+        f = self._forecast
+        forecast = ";".join(["%s,%d,%d" % (f.icons[x], f.low[x], f.high[x]) for x in range(f.count)])
+        streamers = ",".join(self._streamers.names[:self._streamers.count])
+        return "\n".join((forecast, streamers, ";".join(teams)))
+
+    def decode_state(self, forecast, streamers, teams):
+        # Raises ValueError on a malformed record, the state is cleared then
+        try:
+            self.clear_state()
+            f = self._forecast
+            for x in forecast.split(";") if len(forecast) > 0 else ():
+                if f.count >= len(f.icons):
+                    break
+                icon, low, high = x.split(",")
+                f.set(f.count, icon, int(low), int(high))
+                f.count += 1
+            for x in streamers.split(",") if len(streamers) > 0 else ():
+                self._streamers.add(x)
+            for x in teams.split(";") if len(teams) > 0 else ():
+                # Teams no longer in the config are dropped
+                league = self._sports.get(x.split("/")[0])
+                if league is not None and x in league.keys:
+                    league.live[league.keys.index(x)] = 1
+        except ValueError:
+            self.clear_state()
+            raise
+
+    def encode_aggregate(self):
+        return (AGGREGATOR_VERSION + "\n" + self.encode_state()).encode("utf-8")
+
+    def decode_aggregate(self, body):
+        lines = str(body, "utf-8").split("\n")
+        if len(lines) != 4 or lines[0] != AGGREGATOR_VERSION:
+            raise ValueError("Unsupported aggregator payload")
+        self.decode_state(lines[1], lines[2], lines[3])
+
+    def encode_time(self):
+        # Local time for the X-Glance-Time header, None before the first sync
+        datetime = self._clock.now()
+        if datetime is None:
+            return None
+        return ",".join([str(x) for x in tuple(datetime)[:9]])
+
+    def decode_time(self, text):
+        return time.struct_time(tuple([int(x) for x in text.split(",")]))
+
+    def clear_state(self):
+        self._forecast.count = 0
+        self._streamers.clear()
+        for league in self._sports.values():
+            league.clear_scratch()
+            league.commit()
+
+    def load_snapshot(self):
+        record = self._snapshot_store.load()
+        if record is None:
+            return False
+        try:
+            version, updated, today, forecast, streamers, teams = str(record, "utf-8").split("\n")
+            if version != SNAPSHOT_VERSION:
+                return False
+            self._updated = updated
+            self._today = int(today)
+            self.decode_state(forecast, streamers, teams)
+        except (ValueError, UnicodeError) as e:
+            print("Ignoring stored snapshot\n", e)
+            self.clear_state()
+            return False
+        self._snapshot_body = record[len(version) + len(updated) + 2:]
+        return True
+
+    def save_snapshot(self):
+        if len(self._updated) == 0:
+            return
+        now = self._hw.monotonic()
+        recent = self._snapshot_saved_at is not None and now - self._snapshot_saved_at < SNAPSHOT_MAX_AGE
+        # Only encoded when a section changed or the stored copy is due a rewrite
+        if recent and not self._snapshot_dirty:
+            return
+        record = self.encode_snapshot(self._updated).encode("utf-8")
+        body = record[len(SNAPSHOT_VERSION) + len(self._updated) + 2:]
+        self._snapshot_dirty = False
+        if body == self._snapshot_body and recent:
+            return
+        try:
+            self._snapshot_store.save(record)
+            self._snapshot_body = body
+            self._snapshot_saved_at = now
+        except ValueError as e:
+            print("Snapshot not saved\n", e)
+
+    def show_snapshot(self):
+        if not self.load_snapshot():
+            return
+        print("Showing stored snapshot from " + self._updated)
+        self._stale = set(self._sources)
+        self.render_weather()
+        self.render_streamers()
+        self.render_sports()
+        self.set_text("updated_group", 0, "s" + self._updated[1:])
+        self.show_display()
+
+    def source_done(self, name, ok, live=False):
+        if self._source == name:
+            self._source = None
+        now = self._hw.monotonic()
+        if not ok:
+            # Keep the last value on screen and retry after the back-off
+            self._scheduler.retry(name, now, self._health.failure(name, now))
+            return
+        self._health.success(name, now)
+        self._scheduler.done(name, now, live)
+        if name in self._stale:
+            # Replace each stale section on screen as soon as live data arrives
+            self._stale.remove(name)
+            self.show_display()
+
+    def show_terminal(self):
+        self._hw.display.root_group = self._hw.terminal_group
+        self._hw.display.auto_refresh = True
+
+    def show_display(self):
+        # One explicit refresh per cycle instead of redrawing on every change
+        display = self._hw.display
+        display.auto_refresh = False
+        if display.root_group is not self._root_group:
+            display.root_group = self._root_group
+        with self._metrics.phase("display"):
+            display.refresh()
+        if self.first_pixel_time is None:
+            self.first_pixel_time = self._hw.monotonic() - self._boot_time
+            print("Time to first pixel: %.2fs" % self.first_pixel_time)
+
     def build_datetime(self):
+        self._source = "datetime"
         try:
-            datetime = self.fetch_datetime()
+            with self._metrics.phase("fetch", "datetime"):
+                datetime = self.fetch_datetime()
             if self._debug:
                 print(datetime)
 
-            self._today = datetime.tm_wday
-            formatted_min = "00"
-            if datetime.tm_min < 10:
-                formatted_min = "0" + str(datetime.tm_min)
-            else:
-                formatted_min = str(datetime.tm_min)
-
-            self._updated = "u:" + str(datetime.tm_hour) + ":" + formatted_min
-        except (ValueError, RuntimeError) as e:
+            self._clock.sync(datetime)
+            # Keep the RTC on wall-clock time so stored expiries stay meaningful
+            self._hw.set_time(datetime)
+            return True
+        except (KeyError, ValueError, RuntimeError) as e:
             self._debug_error_counter += 1
             print("Failed to get time data\n", e)
-            time.sleep(5)
+        return False
 
-    def build_weather(self):
+    def build_aggregate(self):
+        self._source = "aggregator"
         try:
-            forecastdata = self.fetch_forecast()
+            with self._metrics.phase("fetch", "aggregator"):
+                changed = self.fetch_aggregate()
+            if changed:
+                self._snapshot_dirty = True
+                self.render_weather()
+                self.render_streamers()
+                self.render_sports()
+            return True
+        except (KeyError, ValueError, RuntimeError) as e:
+            self._debug_error_counter += 1
+            print("Failed to get aggregator data\n", e)
+        return False
+
+    def update_datetime(self):
+        # Derived from the local clock, no request needed between syncs
+        datetime = self._clock.now()
+        if datetime is None:
+            return
+        self._today = datetime.tm_wday
+        minute = datetime.tm_hour * 60 + datetime.tm_min
+        if minute != self._updated_minute:
+            self._updated_minute = minute
+            self._updated = "u:%d:%02d" % (datetime.tm_hour, datetime.tm_min)
 
-            for idx,x in enumerate(forecastdata):
-                if self._debug:
-                    print(idx, " ", x[0], " ", str(x[1]), " ", str(x[2]))
-                weather_icon = "/icons/weather/"+ x[0] + ".bmp"
-                try:
-                    icon_file = open(weather_icon, "rb")
-                except OSError as e:
-                    icon_file = open(self._settings["default_weather_icon"], "rb")
-                icon = displayio.OnDiskBitmap(icon_file)
-                icon_sprite = displayio.TileGrid(icon, pixel_shader=displayio.ColorConverter(), x=16+(idx*50), y=100)
-                self._display_groups["weather_group"].append(icon_sprite)
-
-                temp = "H:" + str(x[2]) + "\nL:" + str(x[1])
-                temp_area = label.Label(terminalio.FONT, text=temp)
-                temp_area.x = 22+(idx*50)
-                temp_area.y = 150
-                self._display_groups["temp_group"].append(temp_area)
-
-                d = self.get_dayname(self._today+idx)
-                day_area = label.Label(terminalio.FONT, text=d)
-                day_area.x = 22+(idx*50)
-                day_area.y = 90
-                self._display_groups["days_group"].append(day_area)
+    def build_weather(self):
+        self._source = "forecast"
+        try:
+            with self._metrics.phase("fetch", "forecast"):
+                forecast = self.fetch_forecast(self._forecast_next)
+            if not forecast.same(self._forecast):
+                self._forecast, self._forecast_next = forecast, self._forecast
+                self._snapshot_dirty = True
+                self.render_weather()
+            return True
         except (KeyError, ValueError, RuntimeError) as e:
             self._debug_error_counter += 1
             print("Failed to get forecast data\n", e)
-            time.sleep(5)
-
-    def build_sports(self):
-        live_teams = 0
-        leagues = self._settings["sports_leagues"].split(",")
+        return False
 
-        for idx,x in enumerate(leagues):
+    def render_weather(self):
+        with self._metrics.phase("render", "weather"):
+            f = self._forecast
+            for idx in range(f.count):
+                if self._debug:
+                    print(idx, " ", f.icons[idx], " ", f.low[idx], " ", f.high[idx])
+                weather_icon = self.icon_path(self._weather_icons, "/icons/weather/", f.icons[idx])
+                self.set_icon("weather_group", idx, weather_icon, self._settings["default_weather_icon"])
+                self.set_text("temp_group", idx, "H:%d\nL:%d" % (f.high[idx], f.low[idx]))
+                self.set_text("days_group", idx, self.get_dayname(self._today+idx))
+            self.hide_icons("weather_group", f.count)
+
+    def build_sports(self, leagues=None):
+        if leagues is None:
+            leagues = self._leagues
+        refreshed = list()
+        changed = False
+
+        for x in leagues:
+            self._source = x
             try:
-                current_league = x
-                live_teams = self.fetch_league(current_league, self._settings["sports_api_" + x + "_teams"], self._settings["sports_api_" + x], self._display_groups["sports_group"], live_teams)
+                with self._metrics.phase("fetch", x):
+                    league = self.fetch_league(self._sports[x])
+                if league.commit():
+                    changed = True
+                refreshed.append(x)
             except (KeyError, ValueError, RuntimeError) as e:
                 self._debug_error_counter += 1
-                print("Failed to get " + current_league + " data\n", e)
-                time.sleep(5)
+                print("Failed to get " + x + " data\n", e)
+        self._source = None
+        if changed:
+            self._snapshot_dirty = True
+            self.render_sports()
+        return refreshed
+
+    def render_sports(self):
+        with self._metrics.phase("render", "sports"):
+            numlive = 0
+            slots = len(self._display_groups["sports_group"])
+
+            for x in self._leagues:
+                league = self._sports[x]
+                for idx in range(len(league.teams)):
+                    if numlive >= slots:
+                        break
+                    if not league.live[idx]:
+                        continue
+                    if self._debug:
+                        print(league.icons[idx])
+                    self.set_icon("sports_group", numlive, league.icons[idx], self._settings["default_weather_icon"])
+                    numlive = numlive + 1
+            self.hide_icons("sports_group", numlive)
 
     def build_streamers(self):
-        streamer_index = 0
-
         ## Get Twitch Streamer Data
+        self._source = "twitch"
         try:
-            streamerdata = self.fetch_twitch_streams()
-            print(streamerdata)
-
-            for idx,x in enumerate(streamerdata):
-                streamer_img = "/icons/streamers/"+ x + ".bmp"
-                if self._debug:
-                    print(streamer_img)
-                try:
-                    streamer_file = open(streamer_img, "rb")
-                except OSError as e:
-                    streamer_file = open(self._settings["default_twitch_icon"], "rb")
-                img = displayio.OnDiskBitmap(streamer_file)
-                img_sprite = displayio.TileGrid(img, pixel_shader=displayio.ColorConverter(), x=streamer_index*34, y=2)
-                self._display_groups["stream_group"].append(img_sprite)
-                streamer_index = streamer_index + 1
+            with self._metrics.phase("fetch", "twitch"):
+                streamers = self.fetch_twitch_streams(self._streamers_next)
+            if not streamers.same(self._streamers):
+                self._streamers, self._streamers_next = streamers, self._streamers
+                self._snapshot_dirty = True
+                print(self._streamers.names[:self._streamers.count])
+                self.render_streamers()
+            return True
         except (KeyError, ValueError, RuntimeError) as e:
             self._debug_error_counter += 1
             print("Failed to get twitch streamer data\n", e)
-            time.sleep(5)
-
-    def build_display(self):
-        try:
-            self._led.value = True
-            time.sleep(1)
-
-            if self._debug:
-                print("Building display")
-
-            self.reset_display_groups()
-            self._debug_error_counter = 0
-            self._debug_refresh_counter += 1
-
-            self.build_datetime()
-            self.build_weather()
-            self.build_streamers()
-            self.build_sports()
-
-            self._debug_total_error_counter += self._debug_error_counter
+        return False
 
-            ## Build Display
-            updated_area = label.Label(terminalio.FONT, text=self._updated)
-            updated_area.x = 275
-            updated_area.y = 230
-            self._display_groups["updated_group"].append(updated_area)
+    def render_streamers(self):
+        with self._metrics.phase("render", "streamers"):
+            streamer_index = 0
+            slots = len(self._display_groups["stream_group"])
 
-            if self._debug:
-                memory_area = label.Label(terminalio.FONT, text="a:" + str(gc.mem_alloc()) + " f:" + str(gc.mem_free()))
-                memory_area.x = 10
-                memory_area.y = 230
-                self._display_groups["memory_group"].append(memory_area)
-
-                error_area = label.Label(terminalio.FONT, text="r:" +str(self._debug_refresh_counter) + " e:" + str(self._debug_error_counter) + "/" + str(self._debug_total_error_counter) + " r:" + str(self._debug_reset_counter) + "/" + str(self._debug_total_reset_counter))
-                error_area.x = 115
-                error_area.y = 230
-                self._display_groups["error_group"].append(error_area)
-
-            display_group = displayio.Group()
-            display_group.append(self._display_groups["weather_group"])
-            display_group.append(self._display_groups["days_group"])
-            display_group.append(self._display_groups["temp_group"])
-            display_group.append(self._display_groups["stream_group"])
-            display_group.append(self._display_groups["sports_group"])
-            display_group.append(self._display_groups["updated_group"])
+            for idx in range(self._streamers.count):
+                if streamer_index >= slots:
+                    break
+                streamer_img = self.icon_path(self._streamer_icons, "/icons/streamers/", self._streamers.names[idx])
+                if self._debug:
+                    print(streamer_img)
+                self.set_icon("stream_group", streamer_index, streamer_img, self._settings["default_twitch_icon"])
+                streamer_index = streamer_index + 1
+            self.hide_icons("stream_group", streamer_index)
+
+    def next_refresh(self):
+        now = self._hw.monotonic()
+        if self._reconnect_at is not None:
+            # Nothing can be fetched before the WiFi is back
+            return max(0, self._reconnect_at - now)
+        due = self._scheduler.seconds_until_due(now)
+        # Nothing scheduled when no source is enabled
+        return 60 if due is None else due
+
+    def ensure_connected(self):
+        # False while a reconnect after an ESP32 reset is still backing off
+        if self._reconnect_at is None:
+            return True
+        if self._hw.monotonic() < self._reconnect_at:
+            return False
+        self.reconnect_wifi()
+        self._health.success("network", self._hw.monotonic())
+        return True
+
+    @property
+    def hardware(self):
+        return self._hw
+
+    @property
+    def stale(self):
+        return len(self._stale) > 0
+
+    @property
+    def ready(self):
+        # Every source has refreshed at least once or its circuit is open, so
+        # one dead provider doesn't hold back the others, and at least one
+        # has refreshed
+        refreshed = False
+        for x in self._sources:
+            if self._scheduler.get(x).last_refresh is not None:
+                refreshed = True
+            elif self._health.get(x).state == CLOSED:
+                return False
+        return refreshed
+
+    def begin_refresh(self, force=False):
+        self._metrics.begin_cycle()
+        self._led.value = True
+        if self._debug:
+            print("Building display")
 
-            if self._debug:
-                display_group.append(self._display_groups["memory_group"])
-                display_group.append(self._display_groups["error_group"])
+        self._debug_error_counter = 0
+        self._debug_alloc_counter = 0
+        self._debug_refresh_counter += 1
+
+        ## Refresh only the sources that are due
+        now = self._hw.monotonic()
+        due = self._scheduler.due(now, force)
+        if "datetime" not in due and "datetime" in self._sources and self._clock.needs_sync():
+            due.append("datetime")
+        # Sources with an open circuit are skipped until their probe is due
+        due = [x for x in due if self._health.allow(x, now)]
+        if self._debug:
+            print("Due:", due)
+        return due
+
+    def refresh_datetime(self, due):
+        today = self._today
+        if "datetime" in due:
+            self.source_done("datetime", self.build_datetime())
+        self.update_datetime()
+        if today != self._today and "forecast" not in due:
+            self.render_weather()
+
+    def refresh_source(self, name):
+        # One source on its own, the async engine runs each as a task
+        if name == "datetime":
+            self.refresh_datetime([name])
+        elif name == "aggregator":
+            self.source_done("aggregator", self.build_aggregate())
+            self.update_datetime()
+        elif name == "forecast":
+            self.source_done("forecast", self.build_weather())
+        elif name == "twitch":
+            ok = self.build_streamers()
+            self.source_done("twitch", ok, self._streamers.count > 0)
+        else:
+            refreshed = self.build_sports([name])
+            self.source_done(name, name in refreshed, self._sports[name].live_count() > 0)
+
+    def finish_refresh(self):
+        self._debug_total_error_counter += self._debug_error_counter
+
+        ## Build Display
+        if len(self._stale) == 0:
+            self.set_text("updated_group", 0, self._updated)
+        else:
+            self.set_text("updated_group", 0, "s" + self._updated[1:])
 
-            board.DISPLAY.root_group = display_group
+        if self._debug:
+            self.set_text("memory_group", 0, "a:%d f:%d" % (self._hw.mem_alloc(), self._hw.mem_free()))
+            self.set_text("error_group", 0, "r:%d e:%d/%d r:%d/%d o:%d b:%d" % (self._debug_refresh_counter, self._debug_error_counter, self._debug_total_error_counter,
+                                                                          self._debug_reset_counter, self._debug_total_reset_counter, self._debug_alloc_counter, int(self._health.blocked_time)))
+            # Timings of the previous cycle, this one ends after the refresh
+            self.set_text("metrics_group", 0, self._metrics.overlay())
+            print("Display objects allocated:", self._debug_alloc_counter)
+            print(self._requests.stats())
+            print(self._health.stats())
+
+        self._debug_total_alloc_counter += self._debug_alloc_counter
+        self.show_display()
+        if self.first_live_time is None and len(self._stale) == 0:
+            self.first_live_time = self._hw.monotonic() - self._boot_time
+            print("Time to first live display: %.2fs" % self.first_live_time)
+        if self._debug_error_counter == 0:
+            self.save_snapshot()
+        self._metrics.end_cycle()
+
+        self._led.value = False
+        self._debug_reset_counter = 0
 
-            self._led.value = False
-            self._debug_reset_counter = 0
+        if self._debug:
+            print("Done building display")
 
-            if self._debug:
-                print("Done building display")
-        except (RuntimeError) as re:
-            print("Error building display\n", re)
+    def refresh_failed(self, e):
+        if isinstance(e, RuntimeError):
+            print("Error building display\n", e)
+            self.source_failed()
+            self._metrics.end_cycle()
             gc.collect()
-        except (TimeoutError, BrokenPipeError, ConnectionError) as te:
-            # Defensive exception handling for TimeoutError: Timed out waiting for SPI char
-            # Defensive exception handling for BrokenPipeError: Expected XX but got YY
-            # Defensive exception handling for ConnectionError: Failed to request hostname
-            print("TimeoutError/BrokenPipeError/ConnectionError in building display, attempt " + str(self._debug_reset_counter) + ", retrying:\n", te)
-            self._debug_reset_counter += 1
-            self._debug_total_reset_counter += 1
-
-            if self._debug_reset_counter >= 5:
-                    board.DISPLAY.root_group = displayio.CIRCUITPYTHON_TERMINAL
-
-            if self._debug_reset_counter <= 20:
-                gc.collect()
-                self._esp.reset()
-                time.sleep(15)
-                self.connect_wifi()
+            return
+
+        # Defensive exception handling for TimeoutError: Timed out waiting for SPI char
+        # Defensive exception handling for BrokenPipeError: Expected XX but got YY
+        # Defensive exception handling for ConnectionError: Failed to request hostname
+        print("TimeoutError/BrokenPipeError/ConnectionError in building display, attempt " + str(self._debug_reset_counter) + ", retrying:\n", e)
+        self._debug_reset_counter += 1
+        self._debug_total_reset_counter += 1
+
+        if self._debug_reset_counter >= 5:
+                self.show_terminal()
+
+        # Reset now and reconnect once the back-off has passed, the ESP32
+        # boots while the loop waits in next_refresh() instead of sleeping here
+        self.source_failed()
+        self._metrics.end_cycle()
+        gc.collect()
+        self._esp.reset()
+        now = self._hw.monotonic()
+        self._reconnect_at = now + self._health.failure("network", now)
+
+    def build_display(self, force=False):
+        # False when the cycle was cut short by a connection or request error
+        try:
+            if not self.ensure_connected():
+                return False
+
+            due = self.begin_refresh(force)
+            self.block("led", 1)
+            self.refresh_datetime(due)
+
+            if "aggregator" in due:
+                self.refresh_source("aggregator")
+
+            if "forecast" in due:
+                self.source_done("forecast", self.build_weather())
+
+            if "twitch" in due:
+                ok = self.build_streamers()
+                self.source_done("twitch", ok, self._streamers.count > 0)
+
+            leagues = [x for x in self._leagues if x in due]
+            if len(leagues) > 0:
+                refreshed = self.build_sports(leagues)
+                for x in leagues:
+                    self.source_done(x, x in refreshed, self._sports[x].live_count() > 0)
+
+            self.finish_refresh()
+            return True
+        except (RuntimeError, TimeoutError, BrokenPipeError, ConnectionError) as e:
+            self.refresh_failed(e)
+        return False
+
+    def source_failed(self):
+        # The source that was being fetched when the error escaped build_display
+        if self._source is not None:
+            self.source_done(self._source, False)
+            self._source = None
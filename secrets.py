@@ -14,21 +14,14 @@ secrets = {
     "twitch_api_key" : "", # Twitch API key
     "twitch_api_secret" : "", # Twitch API secret
     "twitch_api_streamers" : "", # Comma-delimited list of Twitch streamer handles
-    "sports_leagues" : "", # Comma-delimited list of league abbreviations
-    "sports_api_mlb" : "https://site.web.api.espn.com/apis/v2/scoreboard/header?sport=baseball&league=mlb&region=us&lang=en&contentorigin=espn&tz=America/New_York&team=",
+    "sports_leagues" : "", # Comma-delimited list of leagues: mlb, nfl, nhl, prem, mls, nwsl, usmnt, uswnt
+    # ESPN URLs are built in; add "sports_api_<league>" : "https://..." to override one
     "sports_api_mlb_teams" : "", # Comma-delimited list of team abbreviations
-    "sports_api_nfl" : "https://site.web.api.espn.com/apis/v2/scoreboard/header?sport=football&league=nfl&region=us&lang=en&contentorigin=espn&tz=America/New_York&team=",
     "sports_api_nfl_teams" : "", # Comma-delimited list of team abbreviations
-    "sports_api_nhl" : "https://site.web.api.espn.com/apis/v2/scoreboard/header?sport=hockey&league=nhl&region=us&lang=en&contentorigin=espn&tz=America/New_York&team=",
     "sports_api_nhl_teams" : "", # Comma-delimited list of team abbreviations
-    "sports_api_prem" : "https://site.web.api.espn.com/apis/v2/scoreboard/header?sport=soccer&league=eng.1&region=us&lang=en&contentorigin=espn&tz=America/New_York&team=",
     "sports_api_prem_teams" : "", # Comma-delimited list of team abbreviations,
-    "sports_api_mls" : "https://site.web.api.espn.com/apis/v2/scoreboard/header?sport=soccer&league=usa.1&region=us&lang=en&contentorigin=espn&tz=America/New_York&team=",
     "sports_api_mls_teams" : "", # Comma-delimited list of team abbreviations
-    "sports_api_nwsl" : "https://site.web.api.espn.com/apis/v2/scoreboard/header?sport=soccer&league=usa.nwsl&region=us&lang=en&contentorigin=espn&tz=America/New_York&team=",
     "sports_api_nwsl_teams" : "", # Comma-delimited list of team abbreviations
-    "sports_api_usmnt" : "https://site.web.api.espn.com/apis/v2/scoreboard/header?sport=soccer&region=us&lang=en&contentorigin=espn&tz=America/New_York&team=",
     "sports_api_usmnt_teams" : "", # Comma-delimited list of team abbreviations
-    "sports_api_uswnt" : "https://site.web.api.espn.com/apis/v2/scoreboard/header?sport=soccer&region=us&lang=en&contentorigin=espn&tz=America/New_York&team=",
     "sports_api_uswnt_teams" : ""  # Comma-delimited list of team abbreviations
     }
\ No newline at end of file
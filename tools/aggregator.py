@@ -0,0 +1,61 @@
+## Runs the companion aggregator (see glance_aggregator.py).
+##   python tools/aggregator.py [--port 8080] [--secrets dir] [--displays displays.json] [--stand-in | --fixtures dir]
+## Every display uses secrets.py, with the per-display overrides from
+## displays.json ({"kitchen": {"sports_leagues": "nhl"}, ...}) applied on
+## top. Without displays.json there is one display called "display".
+## --stand-in serves the synthetic payloads from benchmarks/payloads.py and
+## --fixtures replays a recorded fixture directory instead of calling the
+## real APIs; neither needs network access or credentials.
+import sys
+import os
+import json
+import argparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from glance_aggregator import Aggregator, serve
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--secrets")
+    parser.add_argument("--displays")
+    parser.add_argument("--ttl", type=int, default=30)
+    parser.add_argument("--stand-in", action="store_true")
+    parser.add_argument("--fixtures")
+    args = parser.parse_args()
+
+    routes = None
+    if args.stand_in:
+        sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+        import payloads
+        base = payloads.config()
+        routes = payloads.routes(base)
+    elif args.fixtures is not None:
+        from glance_fixtures import Replayer
+        replayer = Replayer(args.fixtures)
+        base = replayer.config
+        routes = {"https://": replayer, "http://": replayer}
+    else:
+        if args.secrets is not None:
+            sys.path.insert(0, args.secrets)
+        from secrets import secrets
+        base = secrets
+
+    overrides = {"display": {}}
+    if args.displays is not None:
+        with open(args.displays) as f:
+            overrides = json.load(f)
+    configs = {}
+    for name, values in overrides.items():
+        cfg = dict(base)
+        cfg.update(values)
+        # The aggregator itself always talks to the upstream APIs
+        cfg.pop("aggregator_url", None)
+        configs[name] = cfg
+
+    serve(Aggregator(configs, routes, args.ttl), port=args.port)
+
+if __name__ == "__main__":
+    main()
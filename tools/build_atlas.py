@@ -0,0 +1,50 @@
+## Packs each icon directory into a single sprite sheet for glance_icons.
+##   python tools/build_atlas.py path/to/CIRCUITPY/icons
+## Writes atlas.bmp (24-bit, 32x32 tiles, row-major) and atlas.idx (one icon
+## name per line, line number = tile index) next to the loose icons in
+## icons/weather, icons/streamers and every icons/sports/<league>.
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from glance_headless import Bitmap, read_bmp, write_bmp
+from glance_icons import ATLAS_NAME, TILE_SIZE
+
+MAX_COLUMNS = 16
+
+def build_atlas(directory):
+    names = sorted(x[:-4] for x in os.listdir(directory) if x.endswith(".bmp") and x != ATLAS_NAME + ".bmp")
+    if len(names) == 0:
+        return 0
+    columns = min(len(names), MAX_COLUMNS)
+    rows = (len(names) + columns - 1) // columns
+    sheet = Bitmap(columns * TILE_SIZE, rows * TILE_SIZE)
+    for idx, name in enumerate(names):
+        with open(os.path.join(directory, name + ".bmp"), "rb") as f:
+            icon = read_bmp(f.read())
+        if icon.width != TILE_SIZE or icon.height != TILE_SIZE:
+            raise ValueError("%s/%s.bmp is %dx%d, icons must be %dx%d" % (directory, name, icon.width, icon.height, TILE_SIZE, TILE_SIZE))
+        ox = (idx % columns) * TILE_SIZE
+        oy = (idx // columns) * TILE_SIZE
+        for y in range(TILE_SIZE):
+            src = y * TILE_SIZE * 3
+            dst = ((oy + y) * sheet.width + ox) * 3
+            sheet._pixels[dst:dst + TILE_SIZE * 3] = icon._pixels[src:src + TILE_SIZE * 3]
+    with open(os.path.join(directory, ATLAS_NAME + ".bmp"), "wb") as f:
+        f.write(write_bmp(sheet))
+    with open(os.path.join(directory, ATLAS_NAME + ".idx"), "w") as f:
+        f.write("\n".join(names) + "\n")
+    return len(names)
+
+def main(root):
+    directories = [os.path.join(root, "weather"), os.path.join(root, "streamers")]
+    sports = os.path.join(root, "sports")
+    if os.path.isdir(sports):
+        directories += [os.path.join(sports, x) for x in sorted(os.listdir(sports)) if os.path.isdir(os.path.join(sports, x))]
+    for directory in directories:
+        if os.path.isdir(directory):
+            print("%-40s %d icons" % (directory, build_atlas(directory)))
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "icons")
@@ -0,0 +1,27 @@
+## Precompiles the device modules to .mpy with mpy-cross, for less RAM and
+## a faster import on the PyPortal.
+##   python tools/build_mpy.py [out_dir] [mpy-cross]
+## Copy the .mpy files to CIRCUITPY next to code.py and secrets.py, which
+## stay .py. mpy-cross must match the CircuitPython major version on the
+## board (https://adafruit-circuit-python.s3.amazonaws.com/index.html?prefix=bin/mpy-cross/).
+import sys
+import os
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+## Modules that run on the device. Source modules from glance_sources.py
+## are imported on first use, so unused ones can be left off the board.
+MODULES = ("pyglanceportal", "glance_sources", "glance_state", "glance_hardware", "glance_icons", "glance_scheduler",
+           "glance_store", "glance_clock", "glance_http", "glance_health", "glance_metrics", "glance_json",
+           "glance_weather", "glance_sports", "glance_twitch", "glance_async")
+
+def main(out_dir="build", mpy_cross="mpy-cross"):
+    os.makedirs(out_dir, exist_ok=True)
+    for name in MODULES:
+        target = os.path.join(out_dir, name + ".mpy")
+        subprocess.run([mpy_cross, "-o", target, os.path.join(ROOT, name + ".py")], check=True)
+        print("%-20s %6d bytes" % (name + ".mpy", os.path.getsize(target)))
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
@@ -0,0 +1,31 @@
+## Records one full refresh against the live APIs into a fixture directory
+## for offline replay (see glance_fixtures.py).
+##   python tools/record_fixtures.py fixtures/home [path/to/secrets_dir]
+## Needs network access and a secrets.py with working credentials. Secret
+## values are redacted from the stored URLs, bodies and config.
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from glance_headless import HeadlessHardware
+from glance_fixtures import Recorder
+
+def main(directory, secrets_dir=None):
+    if secrets_dir is not None:
+        sys.path.insert(0, secrets_dir)
+    from secrets import secrets
+    from pyglanceportal import PyGlancePortal
+
+    recorder = Recorder(directory, secrets)
+    hw = HeadlessHardware(routes={"https://": recorder, "http://": recorder})
+    portal = PyGlancePortal(debug=False, hardware=hw, config=secrets)
+    portal.build_display(force=True)
+    recorder.save()
+    print("Recorded %d requests to %s" % (sum(len(x) for x in recorder.index.values()), directory))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python tools/record_fixtures.py fixtures_dir [secrets_dir]")
+        sys.exit(1)
+    main(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)